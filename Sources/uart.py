@@ -18,8 +18,27 @@ import time
 import signal
 import os
 import random
+import atexit
+import mmap
+import re
+import collections
+import queue
+import selectors
+import asyncio
+import concurrent.futures
+import struct
+import bisect
+import zlib
+import binascii
+import io
+import json
+import fcntl
+import termios
+import cProfile
+import pstats
 
 from serial import Serial
+from serial.tools import list_ports
 from datetime import datetime
 
 global listener_alive
@@ -28,12 +47,17 @@ global log_listener_check
 global program_log
 global log_directory
 global log
-global log_lock
+global listener_block_count
+global active_port
 
 
 #Prompt coloring
 def get_now():
-  return '\033[35m' + str(datetime.now()).replace('.', ',') + ':\033[0m'
+  return get_stamp(datetime.now())
+
+
+def get_stamp(moment):
+  return '\033[35m' + str(moment).replace('.', ',') + ':\033[0m'
 
 
 def get_time_stamp():
@@ -48,40 +72,35 @@ def print_error(msg, write_log=True):
   global log_listener_check
   sys.stdout.write('\033[31m' + msg + '\033[0m')
   if write_log:
-    log_thread = threading.Thread(target=log_write, args=[msg.strip('\n'), 'error'])
-    log_thread.start()
+    log_write(msg.strip('\n'), 'error')
 
 
 def print_fatal(msg, write_log=True):
   global log_listener_check
   sys.stdout.write('\033[1;31m' + msg + '\033[0m')
   if write_log:
-    log_thread = threading.Thread(target=log_write, args=[msg.strip('\n'), 'fatal error'])
-    log_thread.start()
+    log_write(msg.strip('\n'), 'fatal error')
 
 
 def print_success(msg, write_log=True):
   global log_listener_check
   sys.stdout.write('\033[32m' + msg + '\033[0m')
   if write_log:
-    log_thread = threading.Thread(target=log_write, args=[msg.strip('\n'), 'success'])
-    log_thread.start()
+    log_write(msg.strip('\n'), 'success')
 
 
 def print_info(msg, write_log=True):
   global log_listener_check
   sys.stdout.write('\033[2m' + msg + '\033[0m')
   if write_log:
-    log_thread = threading.Thread(target=log_write, args=[msg.strip('\n'), 'info'])
-    log_thread.start()
+    log_write(msg.strip('\n'), 'info')
 
 
 def print_warn(msg, write_log=True):
   global log_listener_check
   sys.stdout.write('\033[91m' + msg + '\033[0m')
   if write_log:
-    log_thread = threading.Thread(target=log_write, args=[msg.strip('\n'), 'warning'])
-    log_thread.start()
+    log_write(msg.strip('\n'), 'warning')
 
 
 #Helper functions
@@ -102,50 +121,753 @@ def usleep(us):
 
 
 def log_write(entry, entry_type=''):
-  global program_log
-  global log_lock
-  global log
-  entry_time = datetime.now()
-  if program_log is not None and not os.path.isfile(program_log):
-    program_log = None
-    print_raw(get_now() + ' ')
-    print_warn('Log is missing!\n')
-  if program_log is None:
-    return
-  attempts = 0
-  while log_lock:
-    if attempts == 100:
-      print_error('Log lock timeout!\n')
-      print_input_symbol()
+  if program_log is not None:
+    log_writer.put(program_log, entry, entry_type)
+
+
+#Program log writer
+ansi_escape = re.compile(r'\033\[[0-9;]*[A-Za-z]')
+
+
+class LogWriter:
+  def __init__(self):
+    self.queue = queue.Queue()
+    self.path = None
+    self.file = None
+    self.thread = threading.Thread(target=self.write_loop, daemon=True)
+    self.thread.start()
+
+  def put(self, path, entry, entry_type):
+    self.queue.put((path, datetime.now(), entry, entry_type))
+
+  def stop(self):  #writes everything queued so far and closes the log
+    if self.thread.is_alive():
+      self.queue.put(None)
+      self.thread.join(2)
+
+  def open(self, path):
+    global program_log
+    if self.path == path:
+      if os.path.isfile(path):
+        return True
+      program_log = None
+      print_raw(get_now() + ' ')
+      print_warn('Log is missing!\n')
+      return False
+    if self.file is not None:
+      self.file.close()
+      self.file = None
+    self.file = open(path, 'a')
+    self.path = path
+    return True
+
+  def write_loop(self):
+    while True:
+      batch = [self.queue.get()]
+      while True:  #write everything that piled up while writing the previous batch
+        try:
+          batch.append(self.queue.get_nowait())
+        except queue.Empty:
+          break
+      lines = []
+      path = None
+      stop = False
+      for item in batch:
+        if item is None:
+          stop = True
+          break
+        if item[0] != path and len(lines) != 0:
+          self.write_lines(path, lines)
+          lines = []
+        path, entry_time, entry, entry_type = item
+        if entry_type != '':
+          entry_type += ': '
+        entry = ansi_escape.sub('', entry)
+        lines.append(get_log_time(entry_time) + entry_type + entry.split('\n')[-1].lower() + '\n')
+      if len(lines) != 0:
+        self.write_lines(path, lines)
+      if stop:
+        if self.file is not None:
+          self.file.close()
+          self.file = None
+        return
+
+  def write_lines(self, path, lines):
+    global program_log
+    if path != program_log:  #log was dropped or replaced meanwhile
       return
-    attempts += 1
-    usleep(10)
-  log_lock = True
+    try:
+      if self.open(path):
+        self.file.write(''.join(lines))
+        self.file.flush()
+    except Exception as log_err:
+      program_log = None
+      print_warn('Cannot keep log\n')
+      print_error(str(log_err) + '\n')
+      print_input_symbol()
+
+
+def precise_sleep(deadline):  #sleep until perf_counter() reaches deadline, spin only for the last moment
+  remaining = deadline - time.perf_counter()
+  if remaining > 0.0003:
+    time.sleep(remaining - 0.0002)
+  while time.perf_counter() < deadline:
+    pass
+
+
+def get_frame_bits(uart_port):
+  bits = 1 + uart_port.data_size + uart_port.stop_size  #start bit, data bits and stop bit(s)
+  if uart_port.par != serial.PARITY_NONE:
+    bits += 1
+  return bits
+
+
+def get_wire_time(uart_port, byte_count):  #time it takes to shift byte_count bytes out at configuration of the port
+  return byte_count * get_frame_bits(uart_port) / uart_port.baud
+
+
+#Profiling
+profiler = None  #StageProfiler while stages are timed
+
+
+def format_ns(duration):
+  if duration < 1000:
+    return format(duration, '.0f') + ' ns'
+  if duration < 1000000:
+    return format(duration / 1e3, '.1f') + ' us'
+  return format(duration / 1e6, '.1f') + ' ms'
+
+
+class StageProfiler:  #time spent in each stage of receive and send paths, as power of two histograms
+  def __init__(self):
+    self.stages = {}  #name: [count, total ns, longest ns, count per bit length of duration in ns]
+    self.start = time.monotonic()
+
+  def record(self, stage, start):  #start is perf_counter_ns() taken when the stage began
+    duration = time.perf_counter_ns() - start
+    entry = self.stages.get(stage)
+    if entry is None:
+      entry = self.stages.setdefault(stage, [0, 0, 0, [0] * 64])
+    entry[0] += 1
+    entry[1] += duration
+    if duration > entry[2]:
+      entry[2] = duration
+    entry[3][duration.bit_length()] += 1
+
+  def describe(self):  #lines of the breakdown, stage that took the longest first
+    elapsed = time.monotonic() - self.start
+    lines = []
+    for stage, (count, total, longest, buckets) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+      percentiles = []
+      seen = 0
+      for bits, bucket in enumerate(buckets):  #upper end of the bucket the percentile falls in
+        seen += bucket
+        while len(percentiles) < 2 and seen >= count * (0.5, 0.99)[len(percentiles)]:
+          percentiles.append(min(1 << bits, longest))
+      lines.append(stage.ljust(8) + ': \033[0m' + str(count) + '\033[2m calls, \033[0m' + format_ns(total) +
+                   '\033[2m (' + format(total / 1e7 / elapsed, '.2f') + '% of time), mean \033[0m' +
+                   format_ns(total / count) + '\033[2m, p50 \033[0m' + format_ns(percentiles[0]) +
+                   '\033[2m, p99 \033[0m' + format_ns(percentiles[1]) + '\033[2m, max \033[0m' + format_ns(longest))
+      lines.append('  ' + ', '.join('< ' + format_ns(1 << bits) + ': ' + str(bucket)
+                                    for bits, bucket in enumerate(buckets) if bucket != 0))
+    return lines
+
+
+session_profiles = []  #cProfile of every thread when the session is profiled
+
+
+def start_thread_profile(frame, event, arg):  #first profile event of a new thread starts its own cProfile
+  thread_profile = cProfile.Profile()
   try:
-    if entry_type != '':
-      entry_type += ': '
-    log = open(str(program_log), 'a')
-    log.write(get_log_time(entry_time))
-    for num in range(100):
-      entry = entry.replace(('\033[' + str(num) + 'm'), '')
-    entry_list = str(entry).split('\n')
-    log.write(entry_type + entry_list[-1].lower() + '\n')
-    log.close()
-  except Exception as log_err:
-    program_log = None
-    print_warn('Cannot keep log\n')
-    print_error(str(log_err) + '\n')
-    print_input_symbol()
-  finally:
-    log_lock = False
+    thread_profile.enable()
+  except ValueError:  #newer Pythons profile every thread with a single profiler
+    sys.setprofile(None)
+    return
+  session_profiles.append(thread_profile)
+
+
+def start_session_profile():
+  session_profile = cProfile.Profile()
+  session_profile.enable()
+  session_profiles.append(session_profile)
+  threading.setprofile(start_thread_profile)
+
+
+def save_session_profile(path):  #pstats file of all threads, readable with python -m pstats
+  threading.setprofile(None)
+  for session_profile in session_profiles:
+    session_profile.disable()
+  stats = pstats.Stats(session_profiles[0])
+  for thread_profile in session_profiles[1:]:
+    stats.add(thread_profile)
+  stats.dump_stats(path)
+
+
+#Device discovery
+poll_paths = ('/dev/ttyUSB', '/dev/ttyACM', '/dev/ttyCOM')
+
+
+def probe_port(port, baud_rate):
+  try:
+    conn = Serial(port['path'], baud_rate, timeout=1)
+    conn.close()
+    port['status'] = 'ok'
+  except serial.SerialException:
+    port['status'] = 'busy'
+  except Exception as probe_err:
+    port['status'] = str(probe_err)
+
+
+def describe_port(port):  #vendor, product and serial information of a port if known
+  info = port['info']
+  if info is None:
+    return ''
+  details = []
+  if info.vid is not None and info.pid is not None:
+    details.append(format(info.vid, '04x') + ':' + format(info.pid, '04x'))
+  if info.manufacturer:
+    details.append(info.manufacturer)
+  if info.product:
+    details.append(info.product)
+  elif info.description and info.description != 'n/a':
+    details.append(info.description)
+  if info.serial_number:
+    details.append('serial ' + info.serial_number)
+  if len(details) == 0:
+    return ''
+  return ' [' + ', '.join(details) + ']'
+
+
+class PortInventory:
+  def __init__(self, ttl=5.0, probe_timeout=0.5):
+    self.ttl = ttl  #seconds a probe result is trusted
+    self.probe_timeout = probe_timeout
+    self.ports = []
+    self.updated = None
+    self.lock = threading.Lock()
+
+  def enumerate(self, poll_range):  #lists candidate devices without opening them
+    listed = {}
+    try:
+      for info in list_ports.comports():
+        listed[info.device] = info
+    except Exception as list_err:
+      print_warn('Cannot list serial ports: ' + str(list_err) + '\n', False)
+    candidates = []
+    for poll_path in poll_paths:
+      for i in range(poll_range + 1):
+        path = poll_path + str(i)
+        if path in listed or os.path.exists(path):
+          candidates.append(path)
+    for path in sorted(listed):
+      if path not in candidates:
+        candidates.append(path)
+    return [{'path': path, 'info': listed.get(path), 'status': None} for path in candidates]
+
+  def probe(self, ports, skip, baud_rate):  #opens all candidates at once, waits at most probe_timeout
+    threads = []
+    for port in ports:
+      if port['path'] in skip:
+        port['status'] = 'connected'
+        continue
+      thread = threading.Thread(target=probe_port, args=[port, baud_rate], daemon=True)
+      thread.start()
+      threads.append(thread)
+    deadline = time.monotonic() + self.probe_timeout
+    for thread in threads:
+      thread.join(max(0.0, deadline - time.monotonic()))
+    for port in ports:
+      if port['status'] is None:
+        port['status'] = 'timeout'
+
+  def get(self, poll_range, skip=(), baud_rate=9600, refresh=False):
+    with self.lock:
+      if refresh or self.updated is None or time.monotonic() - self.updated > self.ttl:
+        ports = self.enumerate(poll_range)
+        self.probe(ports, skip, baud_rate)
+        self.ports = ports
+        self.updated = time.monotonic()
+      return [dict(port) for port in self.ports]
+
+
+#Transmit scheduler
+class TxScheduler:
+  def __init__(self, byte_time):
+    self.byte_time = byte_time  #seconds a byte takes on the wire at configuration of the port
+    self.rate = None  #target bytes per second, None for no rate limit
+    self.gap = 0.0  #seconds to wait between chunks
+    self.gap_chunk = 0  #bytes per chunk for gap mode, 0 to use each write as a chunk
+    self.next_slot = 0.0
+    self.byte_count = 0
+    self.wire_time = 0.0
+    self.capture = None  #CaptureSource of the port while recording
+    self.conn = None
+    self.lock = threading.Lock()  #triggers may send while user input is being sent
+    self.checksums = ChecksumSet(checksum_names)  #running checksums of transmitted data
+
+  def paced(self):
+    return self.rate is not None or self.gap != 0
+
+  def describe(self):
+    if self.rate is not None:
+      return format(self.rate, 'g') + ' B/s'
+    if self.gap != 0:
+      desc = format(self.gap * 1000, 'g') + ' ms gap after '
+      if self.gap_chunk == 0:
+        return desc + 'each write'
+      return desc + 'every ' + str(self.gap_chunk) + ' byte(s)'
+    return 'full speed'
 
+  def wait_slot(self):
+    now = time.perf_counter()
+    if self.next_slot > now:
+      precise_sleep(self.next_slot)
+      return self.next_slot
+    return now  #idle or behind, do not burst to catch up
 
-def serial_write(send_data):
+  def put(self, data, checksums=None):  #single write to the device, checksums of the data also go to a given set
+    stage_profiler = profiler  #taken once, so profiling can be turned on or off while the stage runs
+    stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+    self.conn.write(data)
+    if stage_profiler is not None:
+      stage_profiler.record('write', stage_start)
+    if checksums is None:
+      self.checksums.update(data)
+    else:
+      digests = get_checksum_digests(set(self.checksums.names + checksums.names), data)
+      self.checksums.combine(digests, len(data))
+      checksums.combine(digests, len(data))
+    capture = self.capture
+    if capture is not None:
+      capture.transmitted(data)
+
+  def write(self, send_data, checksums=None):
+    with self.lock:
+      view = memoryview(send_data)
+      size = len(view)
+      if not self.paced():
+        self.put(view, checksums)
+      elif self.rate is not None:
+        step = max(1, int(self.rate * 0.005))  #about 5 ms worth of data per write
+        for start in range(0, size, step):
+          part = view[start:start + step]
+          slot = self.wait_slot()
+          self.put(part, checksums)
+          self.next_slot = slot + len(part) / self.rate
+      else:
+        step = self.gap_chunk if self.gap_chunk != 0 else size
+        for start in range(0, size, step):
+          self.wait_slot()
+          self.put(view[start:start + step], checksums)
+          self.next_slot = time.perf_counter() + self.gap
+      self.byte_count += size
+      self.wire_time += size * self.byte_time
+
+
+def serial_write(send_data, checksums=None):
   try:
-    uart_conn.write(send_data)
+    tx_scheduler.write(send_data, checksums)
+    return True
   except Exception as serial_write_error:
     print_error('Cannot send!\n')
     print_error(str(serial_write_error) + '\n')
+    return False
+
+
+def print_send_progress(filename, sent, size, elapsed):
+  msg = '\r\033[2mSending \033[0m' + filename + '\033[2m: ' + str(sent) + '/' + str(size) + ' bytes'
+  if size != 0:
+    msg += ' (' + str(sent * 100 // size) + '%)'
+  if elapsed > 0:
+    msg += ', ' + format(sent / elapsed, '.0f') + ' B/s'
+  print_raw(msg + '\033[0m\033[K')
+  sys.stdout.flush()
+
+
+def send_file(file, filename, checksums):  #returns whether the whole file was written, checksums count what was
+  size = os.fstat(file.fileno()).st_size
+  try:
+    source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+  except (ValueError, OSError):  #empty files and special files cannot be mapped
+    source = None
+  sent = 0
+  start = time.monotonic()
+  next_progress = start + 0.5
+  failed = False
+  view = None
+  try:
+    if source is not None:
+      view = memoryview(source)
+      while sent < size:
+        if not serial_write(view[sent:sent + tx_chunk_size], checksums):
+          failed = True
+          break
+        sent = min(sent + tx_chunk_size, size)
+        if time.monotonic() > next_progress:
+          print_send_progress(filename, sent, size, time.monotonic() - start)
+          next_progress += 0.5
+    else:
+      chunk = bytearray(tx_chunk_size)
+      view = memoryview(chunk)
+      received = file.readinto(chunk)
+      while received:
+        if not serial_write(view[:received], checksums):
+          failed = True
+          break
+        sent += received
+        if time.monotonic() > next_progress:
+          print_send_progress(filename, sent, size, time.monotonic() - start)
+          next_progress += 0.5
+        received = file.readinto(chunk)
+  finally:
+    if view is not None:
+      view.release()
+    if source is not None:
+      try:
+        source.close()
+      except BufferError:  #slices are still held by the traceback of an error, the map goes away with them
+        pass
+  if next_progress != start + 0.5:  #clear the progress line
+    print_raw('\r\033[K')
+  return not failed
+
+
+#Traffic generator
+traffic_patterns = ('random', 'seeded', 'prbs7', 'prbs15', 'counter')
+prbs_polynomials = {'prbs7': (7, 6), 'prbs15': (15, 14)}  #x^order + x^tap + 1
+prbs_periods = {}
+
+
+def get_prbs_period(name):  #a period of 8 sequences makes a whole number of bytes, bits are packed MSB first
+  if name not in prbs_periods:
+    order, tap = prbs_polynomials[name]
+    mask = (1 << order) - 1
+    state = mask
+    period = bytearray(mask)
+    for index in range(mask):
+      value = 0
+      for bit in range(8):
+        new = ((state >> (order - 1)) ^ (state >> (tap - 1))) & 1
+        state = ((state << 1) | new) & mask
+        value = (value << 1) | new
+      period[index] = value
+    prbs_periods[name] = bytes(period)
+  return prbs_periods[name]
+
+
+class PatternSource:  #endless stream of a traffic pattern, taken in chunks
+  def __init__(self, pattern, seed=None):
+    self.pattern = pattern
+    self.rng = random.Random(seed)
+    self.period = None
+    if pattern == 'counter':
+      self.period = bytes(range(256))
+    elif pattern in prbs_polynomials:
+      self.period = get_prbs_period(pattern)
+    self.block = memoryview(b'')
+    self.offset = 0
+
+  def take(self, size):
+    if self.pattern == 'random':
+      return os.urandom(size)
+    if self.pattern == 'seeded':
+      return self.rng.getrandbits(size * 8).to_bytes(size, 'little')
+    period = len(self.period)
+    if len(self.block) < period + size:  #period is repeated so that every chunk is a single slice
+      self.block = memoryview(self.period * ((size + period - 1) // period + 1))
+    chunk = self.block[self.offset:self.offset + size]
+    self.offset = (self.offset + size) % period
+    return chunk
+
+
+class TrafficGenerator:  #sends a pattern on its own thread until stopped
+  def __init__(self, scheduler, source, chunk_size):
+    self.scheduler = scheduler
+    self.source = source
+    self.chunk_size = chunk_size
+    self.sent = 0
+    self.error = None
+    self.start = time.monotonic()
+    self.running = True
+    self.thread = threading.Thread(target=self.send_loop, daemon=True)
+    self.thread.start()
+
+  def send_loop(self):
+    while self.running:
+      try:
+        self.scheduler.write(self.source.take(self.chunk_size))
+      except Exception as generator_error:
+        self.error = generator_error
+        log_write('traffic generator stopped: ' + str(generator_error), 'error')
+        break
+      self.sent += self.chunk_size
+
+  def stop(self):  #returns seconds it run
+    self.running = False
+    self.thread.join()
+    return time.monotonic() - self.start
+
+
+#Bit error rate test
+ber_mismatch = re.compile(b'[^\0]')  #bytes that differ from the sequence
+
+
+class BerChecker:  #compares received data of a port with a PRBS on its own thread, whole chunks at a time
+  def __init__(self, uart_port, pattern, sync_size=8):
+    self.pattern = pattern
+    self.period = get_prbs_period(pattern)
+    self.sync_size = sync_size  #bytes that have to match to take a position in the sequence
+    self.search = self.period + self.period[:sync_size]  #positions near the end of the period can be found too
+    self.block = b''
+    self.offset = None  #position of the next expected byte in the period, None while not in sync
+    self.pending = b''  #received bytes waiting for synchronisation, or for the next chunk after a late mismatch
+    self.resync = None  #position expected at the start of the search after a slip, None when there is no reference
+    self.skipped = 0  #bytes skipped by the current search
+    self.skipped_tail = b''  #last of them, at most a period, to be compared once the position is found
+    self.checked = 0  #bytes compared while in sync
+    self.bit_errors = 0
+    self.byte_errors = 0
+    self.dropped = 0  #bytes missing from the stream, found when synchronised again after a slip
+    self.inserted = 0  #bytes that are not part of the stream, found when synchronised again after a slip
+    self.slips = 0
+    self.gaps = 0  #bytes overwritten in the ring before they could be checked
+    self.unsynced = 0  #bytes skipped while searching for synchronisation
+    self.generator = None  #TrafficGenerator when the PRBS is sent by this tool
+    self.start = time.monotonic()
+    self.consumer = uart_port.ring.add_consumer('ber')
+    self.ring = uart_port.ring
+    self.running = True
+    self.thread = threading.Thread(target=self.check_loop, daemon=True)
+    self.thread.start()
+
+  def stop(self):
+    self.running = False
+    self.ring.remove_consumer(self.consumer)
+    self.consumer.ready.set()
+    if self.generator is not None:
+      self.generator.stop()
+
+  def expected(self, size):
+    period = len(self.period)
+    if len(self.block) < period + size:  #period is repeated so that every chunk is a single slice
+      self.block = self.period * ((size + period - 1) // period + 1)
+    return self.block[self.offset:self.offset + size]
+
+  def synchronise(self, data):  #returns bytes left after the sync window, None if sync is not found yet
+    period = len(self.period)
+    start = 0
+    while len(data) - start >= self.sync_size:
+      position = self.search.find(data[start:start + self.sync_size])
+      if position != -1:
+        self.skip(data[:start])
+        self.synchronised(position)
+        self.offset = (position + self.sync_size) % period
+        self.checked += self.sync_size
+        return data[start + self.sync_size:]
+      start += 1
+    self.skip(data[:start])
+    self.pending = data[start:]
+    return None
+
+  def skip(self, data):
+    self.skipped += len(data)
+    self.skipped_tail = (self.skipped_tail + data)[-len(self.period):]
+
+  def synchronised(self, position):  #accounts for bytes skipped before the sequence was found at position
+    skipped = self.skipped
+    tail = self.skipped_tail
+    self.skipped = 0
+    self.skipped_tail = b''
+    if self.resync is None:
+      self.unsynced += skipped
+      return
+    period = len(self.period)
+    shift = (position - self.resync - skipped) % period  #how far the sequence moved, signed, modulo the period
+    if shift > period // 2:
+      shift -= period
+    self.resync = None
+    if shift > 0:
+      self.dropped += shift
+    elif shift < 0:
+      self.inserted += -shift
+    if shift != 0:
+      self.slips += 1
+    corrupted = min(max(0, skipped + min(shift, 0)), len(tail))  #skipped bytes that stand for sequence bytes
+    if corrupted == 0:
+      return
+    first = (position - corrupted) % period
+    difference = (int.from_bytes(tail[len(tail) - corrupted:], 'big') ^
+                  int.from_bytes((self.period + self.period)[first:first + corrupted], 'big')).to_bytes(corrupted, 'big')
+    self.checked += corrupted
+    self.byte_errors += corrupted - difference.count(0)
+    self.bit_errors += bin(int.from_bytes(difference, 'big')).count('1')
+
+  def compare(self, data):
+    size = len(data)
+    expected = self.expected(size)
+    if data == expected:
+      self.checked += size
+      self.offset = (self.offset + size) % len(self.period)
+      return None
+    difference = (int.from_bytes(data, 'big') ^ int.from_bytes(expected, 'big')).to_bytes(size, 'big')
+    rest = size  #bytes from here on are left to the next chunk or to resync
+    slip = False
+    mismatch = ber_mismatch.search(difference)
+    while mismatch is not None:  #errors before a slip are counted as errors, the slip itself is found by resync
+      first = mismatch.start()
+      window = difference[first:first + self.sync_size]
+      if len(window) < self.sync_size:  #too short to tell a slip from errors, looked at again with the next chunk
+        self.pending = data[first:]
+        rest = first
+        break
+      if len(window) - window.count(0) > len(window) // 4:  #rest is out of sequence, a slip
+        self.resync = (self.offset + first) % len(self.period)
+        rest = first
+        slip = True
+        break
+      mismatch = ber_mismatch.search(difference, first + 1)
+    self.checked += rest
+    self.byte_errors += rest - difference.count(0, 0, rest)
+    self.bit_errors += bin(int.from_bytes(difference[:rest], 'big')).count('1')
+    if slip:
+      self.offset = None
+      return data[rest:]
+    self.offset = (self.offset + rest) % len(self.period)
+    return None
+
+  def check(self, data):
+    data = self.pending + data
+    self.pending = b''
+    while len(data) != 0:
+      if self.offset is None:
+        data = self.synchronise(data)
+        if data is None:
+          return
+        continue
+      data = self.compare(data)
+      if data is None:
+        return
+
+  def check_loop(self):
+    while self.running:
+      self.consumer.wait()
+      if not self.running:
+        break
+      overflow = self.consumer.overflow
+      data = self.consumer.read()
+      if self.consumer.overflow != overflow:  #position in the sequence is unknown after a gap
+        self.gaps += self.consumer.overflow - overflow
+        self.offset = None
+        self.pending = b''
+        self.resync = None
+        self.skipped = 0
+        self.skipped_tail = b''
+      if len(data) != 0:
+        stage_profiler = profiler
+        stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+        self.check(data)
+        if stage_profiler is not None:
+          stage_profiler.record('ber', stage_start)
+
+  def describe(self):  #lines of the report
+    elapsed = time.monotonic() - self.start
+    bits = self.checked * 8
+    lines = ['Checked \033[0m' + str(self.checked) + '\033[2m bytes of ' + self.pattern + ' in ' +
+             format(elapsed, '.1f') + ' s' + ('' if self.offset is not None else ', \033[91mnot in sync\033[2m')]
+    lines.append('Bit errors \033[0m' + str(self.bit_errors) + '\033[2m, byte errors \033[0m' + str(self.byte_errors) +
+                 '\033[2m, dropped \033[0m' + str(self.dropped) + '\033[2m and inserted \033[0m' + str(self.inserted) +
+                 '\033[2m bytes in \033[0m' + str(self.slips) + '\033[2m slips, gaps \033[0m' + str(self.gaps) +
+                 '\033[2m bytes, unsynchronised \033[0m' + str(self.unsynced) + '\033[2m bytes')
+    if bits != 0:
+      lines.append('BER \033[0m' + format(self.bit_errors / bits, '.3e') + '\033[2m, \033[0m' +
+                   format(self.bit_errors * 1e9 / bits, '.2f') + '\033[2m errors per 1e9 bits')
+    if self.generator is not None:
+      lines.append('Sent \033[0m' + str(self.generator.sent) + '\033[2m bytes')
+    return lines
+
+
+#Numeric input parser
+numeric_bases = {'x': 16, 'd': 10, 'o': 8, 'b': 2}
+numeric_prefixes = ('0x', '0d', '0o', '0b')
+numeric_labels = {
+  'x': [hex(i) for i in range(256)],
+  'd': ['0d' + str(i) for i in range(256)],
+  'o': [oct(i) for i in range(256)],
+  'b': [bin(i) for i in range(256)]
+}
+
+
+def parse_numeric(cin):  #returns bytes to send and how they are shown, separators should be removed already
+  global block_listener
+  if bin_ow:
+    default_base = 'b'
+  elif dec_ow:
+    default_base = 'd'
+  else:
+    default_base = 'x'
+  items = cin.split()
+  if default_base == 'x' and data_size == serial.EIGHTBITS:  #plain hex dumps can be converted at once
+    fast_path = True
+    for item in items:
+      #odd lengths, base prefixes and leading zero bytes are not read the same by fromhex
+      if len(item) % 2 != 0 or item.startswith(numeric_prefixes) or (len(item) > 2 and item.startswith('00')):
+        fast_path = False
+        break
+    if fast_path:
+      try:
+        data = bytes.fromhex(cin)
+        return data, ' '.join(map(numeric_labels['x'].__getitem__, data))
+      except ValueError:
+        pass
+  mask = (1 << data_size) - 1
+  data = bytearray()
+  labels = []
+  for item in items:
+    if item.startswith('-'):
+      print_time_stamp()  #print timestamp
+      print_warn("Cannot send negative values!\n\n")
+      print_time_stamp()  #print timestamp
+      print_info("Skipping "+item+"\n\n")
+      continue
+    base = default_base
+    digits = item
+    if item.startswith(numeric_prefixes):
+      base = item[1]
+      digits = item[2:]
+    try:
+      value = int(digits, numeric_bases[base])
+    except ValueError:
+      print_time_stamp()  #print timestamp
+      print_error('0' + base + digits + ' is not a valid number with correct base!\n\n')
+      block_listener = True
+      if safe_tx:
+        break
+      else:
+        continue
+    if value < 0:
+      print_time_stamp()  #print timestamp
+      print_error('0' + base + digits + ' is not a valid number with correct base!\n\n')
+      block_listener = True
+      if safe_tx:
+        break
+      else:
+        continue
+    if value <= mask:
+      data.append(value)
+      labels.append(numeric_labels[base][value])
+      continue
+    #if input is to large divide it into single transfers
+    if data_size == serial.EIGHTBITS:
+      split = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    else:
+      split = bytearray()
+      while value != 0:
+        split.append(value & mask)
+        value >>= data_size
+      split.reverse()
+    data += split
+    labels.extend(map(numeric_labels[base].__getitem__, split))
+  return bytes(data), ' '.join(labels)
 
 
 def print_input_symbol():
@@ -161,8 +883,7 @@ def check_listener(signum, frame):
   if log_listener_check:  #so that log won't be spammed with it
     log_listener_check = False
     msg = 'debug: listener daemon check ' + str(signum) + ' ' + str(frame)
-    log_thread = threading.Thread(target=log_write, args=[msg])
-    log_thread.start()
+    log_write(msg)
   raise ListenerControl
 
 
@@ -170,8 +891,7 @@ def process_timeout(signum, frame):
   global log_listener_check
   print_fatal('Timeout!\n', False)
   msg = 'fatal error: process timeout ' + str(signum) + ' ' + str(frame)
-  log_thread = threading.Thread(target=log_write, args=[msg, 'error'])
-  log_thread.start()
+  log_write(msg, 'error')
   raise TimeoutError
 
 
@@ -183,11 +903,16 @@ def print_help():
   print_raw('  \033[4mAvailable Commands\033[0m:\n')
   print_raw('   ~ \\bin     : print received bytes as binary number\n')
   print_raw('   ~ \\binhex  : print received bytes as binary number and hexadecimal equivalent\n')
+  print_raw('   ~ \\ber     : bit error rate test, [rx] [prbs7|prbs15] starts, stop ends, prints results without argument\n')
+  print_raw('   ~ \\bytewise: write prefix, data and suffix one byte at a time\n')
   print_raw('   ~ \033[7m\\char\033[0m    : print received bytes as character\n')
+  print_raw('   ~ \\chunk   : set size of single writes when sending files, prints current size without argument\n')
+  print_raw('   ~ \\crc     : show running checksums, on or off for received data, reset or select crc32, crc16, modbus, sum8, sum16\n')
   print_raw('   ~ \\dec     : print received bytes as decimal number\n')
   print_raw('   ~ \\dechex  : print received bytes as decimal number and hexadecimal equivalent\n')
   print_raw('   ~ \\dump    : dump received bytes in dumpfile, if argument given use it as file name\n')
   print_raw('   ~ \\exit    : exits the script\n')
+  print_raw('   ~ \\frame   : show received data as frames: slip, cobs, line [delimiter], len [1|2|4] [big|little] or off\n')
   print_raw('   ~ \\getpath : prints working directory\n')
   print_raw('   ~ \\help    : prints this message\n')
   print_raw('   ~ \033[7m\\hex\033[0m     : print received bytes as hexadecimal number\n')
@@ -195,101 +920,3390 @@ def print_help():
   print_raw('   ~ \\license : prints license information\n')
   print_raw('   ~ \\list    : prints connected devices\n')
   print_raw('   ~ \\mute    : do not print received received to terminal\n')
+  print_raw('   ~ \\nobytewise: write prefix, data and suffix of a line in a single write\n')
   print_raw('   ~ \\nodump  : stop dumping received bytes in dumpfile\n')
+  print_raw('   ~ \\norecord: stop recording\n')
+  print_raw('   ~ \\pace    : pace transmitted data, argument is bytes/s, \'gap <ms> [bytes]\' or \'off\'\n')
+  print_raw('   ~ \\port    : select device to send to by tag or index, lists open devices without argument\n')
   print_raw('   ~ \\pref    : add bytes to send before transmitted data, arguments should be given as hexadecimal\n')
-  print_raw('   ~ \033[7m\\rand\033[0m    : send random bytes, argument determines how many\n')
+  print_raw('   ~ \\profile : time receive and send stages, on, off or reset, prints the breakdown without argument\n')
+  print_raw('   ~ \033[7m\\rand\033[0m    : send [size|cont|stop] bytes of [random|seeded|prbs7|prbs15|counter] [seed]\n')
   print_raw('   ~ \033[7m\\quit\033[0m    : exits the script\n')
+  print_raw('   ~ \\record  : record received and transmitted data with timestamps, argument is file name\n')
   print_raw('   ~ \\safe    : in non char mode, stop sending if non number given\n')
   print_raw('   ~ \033[7m\\send\033[0m    : send files\n')
   print_raw('   ~ \\setpath : set directory for file operations, full or relative path, empty for cwd\n')
+  print_raw('   ~ \\stats   : prints receive and transmit statistics, file [filename [seconds] | off] writes them periodically\n')
   print_raw('   ~ \\suff    : add bytes to send after transmitted data, arguments should be given as hexadecimal\n')
+  print_raw('   ~ \\trigger : act on hex bytes or re:<expression> in received data: bell, log, dump [file], nodump, send <hex>\n')
   print_raw('   ~ \\unmute  : print received received to terminal\n')
   print_raw('   ~ \\unsafe  : in non char mode, do not stop sending if non number given\n')
   print_raw('   ~ \\@       : print the path to the connected device\n')
   print_raw('\n  Marked commands can be called with their first letter\n')
 
 
-#listener daemon
-def uart_listener():  #? if possible, keep the prompt already written in terminal when new received
-  print_raw(get_now())
-  print_info(' Listening...\n')
-  timer_stamp = 0
-  last_line = ''
-  last_timestamp = ''
-  byte_counter = 0
-  received_invalid = False
-  global listener_alive
-  global block_listener
+#Receive ring buffer
+class RingConsumer:
+  def __init__(self, ring, name, active=True, ready=None):
+    self.ring = ring
+    self.name = name
+    self.active = active  #inactive consumers are not woken up and skip what they missed once activated
+    self.cursor = ring.head
+    self.overflow = 0  #bytes overwritten before this consumer could read them
+    self.max_lag = 0
+    if ready is None:
+      ready = threading.Event()
+    self.ready = ready
+
+  def lag(self):
+    if not self.active:
+      return 0
+    return self.ring.head - self.cursor
+
+  def activate(self, position=None):
+    self.skip(position)
+    self.active = True
+
+  def deactivate(self):
+    self.active = False
+
+  def wait(self, timeout=None):
+    self.ready.wait(timeout)
+    self.ready.clear()
+
+  def skip(self, position=None):  #returns number of bytes skipped
+    if position is None:
+      position = self.ring.head
+    skipped = position - self.cursor
+    if skipped > 0:
+      self.cursor = position
+      return skipped
+    return 0
+
+  def read(self, max_size=None):  #returns a copy of unread bytes
+    ring = self.ring
+    capacity = ring.capacity
+    available = ring.head - self.cursor
+    if available > capacity:
+      self.overflow += available - capacity
+      self.cursor += available - capacity
+      available = capacity
+    if available > self.max_lag:
+      self.max_lag = available
+    if max_size is not None and available > max_size:
+      available = max_size
+    if available == 0:
+      return b''
+    start = self.cursor % capacity
+    end = start + available
+    if end <= capacity:
+      data = ring.view[start:end].tobytes()
+    else:
+      data = ring.view[start:].tobytes() + ring.view[:end - capacity].tobytes()
+    overwritten = ring.reserved - capacity - self.cursor  #writer may have lapped us while copying
+    if overwritten > 0:
+      overwritten = min(overwritten, available)
+      self.overflow += overwritten
+      data = data[overwritten:]
+    self.cursor += available
+    return data
+
+
+class RingBuffer:  #single writer, readers keep their own cursors so writer never waits for them
+  def __init__(self, capacity=4194304):
+    self.capacity = capacity
+    self.buffer = bytearray(capacity)
+    self.view = memoryview(self.buffer)
+    self.head = 0  #total bytes written
+    self.reserved = 0  #end of the region writer may be changing
+    self.consumers = ()
+
+  def add_consumer(self, name, active=True, ready=None):
+    consumer = RingConsumer(self, name, active, ready)
+    self.consumers = self.consumers + (consumer,)
+    return consumer
+
+  def remove_consumer(self, consumer):
+    self.consumers = tuple(item for item in self.consumers if item is not consumer)
+
+  def writable(self, size):  #contiguous free region at head, fill it and commit
+    start = self.head % self.capacity
+    size = min(size, self.capacity - start)
+    self.reserved = self.head + size
+    return self.view[start:start + size]
+
+  def commit(self, size):
+    self.head += size
+    self.reserved = self.head
+    for consumer in self.consumers:
+      if consumer.active:
+        consumer.ready.set()
+
+  def write(self, data):
+    data = memoryview(data)
+    while len(data) != 0:
+      region = self.writable(len(data))
+      size = len(region)
+      region[:] = data[:size]
+      self.commit(size)
+      data = data[size:]
+
+
+#Dump writer
+class DumpWriter:
+  def __init__(self, ring, flush_size=65536, flush_interval=0.5):
+    self.flush_size = flush_size
+    self.flush_interval = flush_interval
+    self.consumer = ring.add_consumer('dump', False)
+    self.path = None
+    self.file = None
+    self.buffer = bytearray()
+    self.last_flush = time.monotonic()
+    self.lock = threading.Lock()
+    self.flusher = None  #started by the first dump, ports that never dump do not keep a thread
+
+  def open(self, path, start=None):  #switching files writes everything received so far to the old one
+    with self.lock:
+      if self.file is not None:
+        self.collect()
+        self.flush()
+        self.file.close()
+        self.file = None
+      self.file = open(path, 'ab', buffering=0)
+      self.path = path
+      if not self.consumer.active:
+        self.consumer.activate(start)
+      self.last_flush = time.monotonic()
+      if self.flusher is None:
+        self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+    self.consumer.ready.set()
+
+  def close(self, end=None):  #end is the stream position dumping stops at, everything received by default
+    with self.lock:
+      if self.file is not None:
+        self.collect(end)
+        self.flush()
+        self.file.close()
+      self.consumer.deactivate()
+      self.file = None
+      self.path = None
+
+  def collect(self, end=None):  #caller must hold the lock
+    if end is None:
+      self.buffer += self.consumer.read()
+    else:
+      self.buffer += self.consumer.read(max(0, end - self.consumer.cursor))
+      excess = min(self.consumer.cursor - end, len(self.buffer))  #read past the end before the stop was known
+      if excess > 0:
+        del self.buffer[len(self.buffer) - excess:]
+
+  def flush(self):  #caller must hold the lock
+    if self.file is None or len(self.buffer) == 0:
+      return
+    stage_profiler = profiler
+    stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+    try:
+      self.file.write(self.buffer)
+    except Exception as dump_error:
+      print_error('Cannot dump to file \033[0m' + str(self.path) + '\033[31m!\n')
+      print_error(str(dump_error) + '\n')
+    finally:
+      self.buffer.clear()
+      self.last_flush = time.monotonic()
+    if stage_profiler is not None:
+      stage_profiler.record('dump', stage_start)
+
+  def flush_loop(self):
+    while True:
+      self.consumer.wait(self.flush_interval)
+      with self.lock:
+        if self.file is None:
+          continue
+        self.collect()
+        if len(self.buffer) >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval:
+          self.flush()
+
+
+#Checksums
+def get_crc16_table(poly):  #reflected, for crc16 variants that shift right
+  table = []
+  for i in range(256):
+    value = i
+    for bit in range(8):
+      value = (value >> 1) ^ poly if value & 1 else value >> 1
+    table.append(value)
+  return table
+
+
+crc16_modbus_table = get_crc16_table(0xa001)
+
+
+def crc16_modbus(data, value):
+  table = crc16_modbus_table
+  for byte in data:
+    value = (value >> 8) ^ table[(value ^ byte) & 0xff]
+  return value
+
+
+def sum8(data, value):
+  return (value + sum(data)) & 0xff
+
+
+def sum16(data, value):
+  return (value + sum(data)) & 0xffff
+
+
+checksum_algorithms = {  #update function, initial value, hex digits, whether value is a crc register
+  'crc32': (zlib.crc32, 0, 8, True),
+  'crc16': (binascii.crc_hqx, 0xffff, 4, True),  #CCITT, poly 0x1021
+  'modbus': (crc16_modbus, 0xffff, 4, True),
+  'sum8': (sum8, 0, 2, False),
+  'sum16': (sum16, 0, 4, False)
+}
+crc_shifts = {}  #(name, size): register after size zero bytes, as the image of each register bit
+
+
+def apply_crc_shift(shift, value):
+  result = 0
+  bit = 0
+  while value != 0:
+    if value & 1:
+      result ^= shift[bit]
+    value >>= 1
+    bit += 1
+  return result
+
+
+def get_crc_shift(name, size):  #crc of data from any value is its crc from zero xor the shifted value
+  shift = crc_shifts.get((name, size))
+  if shift is None:
+    update, initial, digits, register = checksum_algorithms[name]
+    zero = update(b'\0', 0)
+    power = [update(b'\0', 1 << bit) ^ zero for bit in range(digits * 4)]  #a single zero byte
+    shift = [1 << bit for bit in range(digits * 4)]
+    remaining = size
+    while remaining != 0:
+      if remaining & 1:
+        shift = [apply_crc_shift(power, column) for column in shift]
+      power = [apply_crc_shift(power, column) for column in power]
+      remaining >>= 1
+    if len(crc_shifts) > 256:
+      crc_shifts.clear()
+    crc_shifts[(name, size)] = shift
+  return shift
+
+
+def get_checksum_digests(names, data):  #checksums of a chunk from zero, to be combined into several running sets
+  return {name: checksum_algorithms[name][0](data, 0) for name in names}
+
+
+def combine_checksum(name, value, digest, size):  #same as updating value with the chunk digest was taken from
+  if checksum_algorithms[name][3]:
+    return digest ^ apply_crc_shift(get_crc_shift(name, size), value)
+  return (value + digest) & ((1 << (checksum_algorithms[name][2] * 4)) - 1)
+
+
+class ChecksumSet:  #running checksums of a stream, updated a chunk at a time
+  def __init__(self, names):
+    self.lock = threading.Lock()
+    self.select(names)
+
+  def select(self, names):
+    with self.lock:
+      self.names = tuple(names)
+      self.values = [checksum_algorithms[name][1] for name in self.names]
+      self.size = 0
+      self.lost = 0  #bytes that were not seen, checksums do not cover the whole stream
+
+  def reset(self):
+    self.select(self.names)
+
+  def update(self, data):
+    with self.lock:
+      for index in range(len(self.names)):
+        self.values[index] = checksum_algorithms[self.names[index]][0](data, self.values[index])
+      self.size += len(data)
+
+  def combine(self, digests, size):  #digests of a chunk taken once for every set that sees it
+    with self.lock:
+      for index in range(len(self.names)):
+        self.values[index] = combine_checksum(self.names[index], self.values[index], digests[self.names[index]], size)
+      self.size += size
+
+  def describe(self):
+    with self.lock:
+      labels = []
+      for name, value in zip(self.names, self.values):
+        labels.append(name + ' \033[0m0x' + format(value, '0' + str(checksum_algorithms[name][2]) + 'x') + '\033[2m')
+      return ', '.join(labels)
+
+
+class ChecksumStage:  #keeps checksums of received data of a port on its own thread
+  def __init__(self, ring, names):
+    self.checksums = ChecksumSet(names)
+    self.ring = ring
+    self.consumer = ring.add_consumer('checksum')
+    self.running = True
+    self.thread = threading.Thread(target=self.update_loop, daemon=True)
+    self.thread.start()
+
+  def stop(self):
+    self.running = False
+    self.ring.remove_consumer(self.consumer)
+    self.consumer.ready.set()
+
+  def update_loop(self):
+    while self.running:
+      self.consumer.wait()
+      overflow = self.consumer.overflow
+      data = self.consumer.read()
+      if self.consumer.overflow != overflow:
+        self.checksums.lost += self.consumer.overflow - overflow
+      if len(data) != 0:
+        stage_profiler = profiler
+        stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+        self.checksums.update(data)
+        if stage_profiler is not None:
+          stage_profiler.record('checksum', stage_start)
+
+
+#Capture file
+#header, then records; each record is a record header followed by its payload
+#index records list (time, offset) of records every index_spacing bytes and point to the previous index record
+#footer at the end of a closed capture points to the last index record
+#records are in time order within each batch the writer collects; a transmitted record of a batch may be stamped
+#slightly before the last received record of the previous batch
+capture_magic = b'UARTCAP1'
+capture_end_magic = b'UARTEND1'
+capture_header = struct.Struct('<8sHHIqq')  #magic, version, port count, reserved, wall clock ns, monotonic ns at start
+capture_record = struct.Struct('<BBHIq')  #type, port, flags, payload size, ns since start
+capture_entry = struct.Struct('<qQ')  #ns since start, file offset of record
+capture_footer = struct.Struct('<8sQ')  #magic, file offset of last index record
+capture_rx = 1
+capture_tx = 2
+capture_port = 3  #payload is path and configurations of the port
+capture_index = 4  #payload is offset of previous index record, then entries
+capture_lost = 1  #flag, bytes before this record were lost
+
+
+class CaptureSource:  #received and transmitted data of a single port as seen by the capture writer
+  def __init__(self, writer, uart_port, index):
+    self.writer = writer
+    self.index = index
+    self.ring = uart_port.ring
+    self.consumer = uart_port.ring.add_consumer('capture', True, writer.ready)
+    self.marks = collections.deque()  #(end position, time) of each received chunk, added before commit
+    self.lost = False
+
+  def received(self, end, now):  #called by the listener
+    self.marks.append((end, now))
+
+  def transmitted(self, data):  #called by the transmitter
+    self.writer.tx_queue.put((time.monotonic_ns(), self.index, bytes(data)))
+    self.writer.ready.set()
+
+  def collect(self, records):
+    overflow = self.consumer.overflow
+    data = self.consumer.read()
+    if self.consumer.overflow != overflow:
+      self.lost = True
+    if len(data) == 0:
+      return
+    end = self.consumer.cursor
+    start = end - len(data)
+    position = start
+    marks = self.marks
+    while len(marks) != 0 and marks[0][0] <= end:
+      mark_end, now = marks.popleft()
+      if mark_end <= position:  #overwritten before it could be captured
+        continue
+      records.append((now, capture_rx, self.index, data[position - start:mark_end - start], self.lost))
+      self.lost = False
+      position = mark_end
+    if position < end:  #received while recording was starting, before marks were taken
+      records.append((time.monotonic_ns(), capture_rx, self.index, data[position - start:], self.lost))
+      self.lost = False
+
+
+class CaptureWriter:
+  def __init__(self, flush_size=1048576, flush_interval=0.5, index_spacing=65536, index_size=256):
+    self.flush_size = flush_size
+    self.flush_interval = flush_interval
+    self.index_spacing = index_spacing  #file bytes between index entries
+    self.index_size = index_size  #entries in a single index record
+    self.path = None
+    self.file = None
+    self.sources = ()
+    self.ports = ()
+    self.tx_queue = queue.SimpleQueue()
+    self.ready = threading.Event()
+    self.buffer = bytearray()
+    self.offset = 0  #file offset of end of buffer
+    self.start = 0
+    self.entries = []
+    self.last_entry = 0
+    self.last_index = 0
+    self.last_time = 0
+    self.record_count = 0
+    self.last_flush = time.monotonic()
+    self.lock = threading.Lock()
+    self.thread = threading.Thread(target=self.write_loop, daemon=True)
+    self.thread.start()
+
+  def open(self, path, port_list):
+    self.close()
+    with self.lock:
+      self.file = open(path, 'wb', buffering=0)
+      self.path = path
+      self.start = time.monotonic_ns()
+      self.buffer = bytearray(capture_header.pack(capture_magic, 1, len(port_list), 0, time.time_ns(), self.start))
+      self.offset = len(self.buffer)
+      self.entries = []
+      self.last_entry = 0
+      self.last_index = 0
+      self.last_time = 0
+      self.record_count = 0
+      for index in range(len(port_list)):
+        uart_port = port_list[index]
+        self.append(self.start, capture_port, index, (uart_port.path + ' ' + uart_port.describe()).encode(), False)
+      self.ports = tuple(port_list)
+      self.sources = tuple(CaptureSource(self, port_list[index], index) for index in range(len(port_list)))
+      for uart_port, source in zip(self.ports, self.sources):
+        uart_port.capture = source
+        uart_port.tx_scheduler.capture = source
+      self.flush()
+
+  def close(self):
+    with self.lock:
+      if self.file is None:
+        return
+      for uart_port, source in zip(self.ports, self.sources):
+        uart_port.capture = None
+        uart_port.tx_scheduler.capture = None
+      self.collect()
+      for source in self.sources:
+        source.ring.remove_consumer(source.consumer)
+      self.write_index()
+      self.buffer += capture_footer.pack(capture_end_magic, self.last_index)
+      self.flush()
+      self.file.close()
+      self.file = None
+      self.path = None
+      self.sources = ()
+      self.ports = ()
+
+  def append(self, now, kind, port, payload, lost):  #caller must hold the lock
+    offset = self.offset
+    if offset - self.last_entry >= self.index_spacing:
+      self.entries.append((now - self.start, offset))
+      self.last_entry = offset
+    flags = capture_lost if lost else 0
+    self.buffer += capture_record.pack(kind, port, flags, len(payload), now - self.start)
+    self.buffer += payload
+    self.last_time = now - self.start
+    self.offset += capture_record.size + len(payload)
+    self.record_count += 1
+    if len(self.entries) >= self.index_size:
+      self.write_index()
+
+  def write_index(self):  #caller must hold the lock
+    if len(self.entries) == 0:
+      return
+    offset = self.offset
+    payload = bytearray(struct.pack('<Q', self.last_index))
+    for entry in self.entries:
+      payload += capture_entry.pack(*entry)
+    self.buffer += capture_record.pack(capture_index, 0, 0, len(payload), self.last_time)
+    self.buffer += payload
+    self.offset += capture_record.size + len(payload)
+    self.last_index = offset
+    self.entries = []
+
+  def collect(self):  #caller must hold the lock
+    records = []
+    for source in self.sources:
+      source.collect(records)
+    while True:
+      try:
+        now, port, data = self.tx_queue.get_nowait()
+      except queue.Empty:
+        break
+      records.append((now, capture_tx, port, data, False))
+    records.sort(key=lambda record: record[0])  #readers expect records in time order
+    for record in records:
+      self.append(*record)
+
+  def flush(self):  #caller must hold the lock
+    if self.file is None or len(self.buffer) == 0:
+      return
+    stage_profiler = profiler
+    stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+    try:
+      self.file.write(self.buffer)
+    except Exception as capture_error:
+      print_error('Cannot write capture \033[0m' + str(self.path) + '\033[31m!\n')
+      print_error(str(capture_error) + '\n')
+    finally:
+      self.buffer = bytearray()
+      self.last_flush = time.monotonic()
+    if stage_profiler is not None:
+      stage_profiler.record('capture', stage_start)
+
+  def write_loop(self):
+    while True:
+      self.ready.wait(self.flush_interval)
+      self.ready.clear()
+      with self.lock:
+        if self.file is None:
+          continue
+        self.collect()
+        if len(self.buffer) >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval:
+          self.flush()
+
+
+class CaptureReader:  #memory maps a capture, records are read in place and seeking uses the index
+  def __init__(self, path):
+    self.file = open(path, 'rb')
+    self.size = os.fstat(self.file.fileno()).st_size
+    if self.size < capture_header.size:
+      self.file.close()
+      raise ValueError(path + ' is not a capture file')
+    self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, port_count, reserved, self.wall_start, self.start = capture_header.unpack_from(self.map, 0)
+    if magic != capture_magic:
+      self.close()
+      raise ValueError(path + ' is not a capture file')
+    self.end = self.size  #end of records, footer excluded
+    self.closed = False
+    last_index = None
+    if self.size >= capture_header.size + capture_footer.size:
+      end_magic, footer_index = capture_footer.unpack_from(self.map, self.size - capture_footer.size)
+      if end_magic == capture_end_magic:
+        self.end = self.size - capture_footer.size
+        self.closed = True
+        last_index = footer_index
+    self.ports = []
+    for now, kind, port, flags, payload in self.records():
+      if kind != capture_port:
+        break
+      self.ports.append(bytes(payload).decode(errors='replace'))
+    self.index = self.load_index(last_index)
+
+  def close(self):
+    try:
+      self.map.close()
+    except BufferError:  #records still referenced, map is released with them
+      pass
+    self.file.close()
+
+  def load_index(self, last_index):
+    entries = []
+    if last_index is None:  #capture was not closed, rebuild index from record headers
+      offset = capture_header.size
+      last_entry = 0
+      while offset + capture_record.size <= self.end:
+        kind, port, flags, size, now = capture_record.unpack_from(self.map, offset)
+        if offset + capture_record.size + size > self.end:
+          self.end = offset  #last record was cut off
+          break
+        if offset - last_entry >= 65536:
+          entries.append((now, offset))
+          last_entry = offset
+        offset += capture_record.size + size
+      return entries
+    blocks = []
+    while last_index != 0:
+      kind, port, flags, size, now = capture_record.unpack_from(self.map, last_index)
+      payload_start = last_index + capture_record.size
+      block = list(capture_entry.iter_unpack(self.map[payload_start + 8:payload_start + size]))
+      blocks.append(block)
+      last_index = struct.unpack_from('<Q', self.map, payload_start)[0]
+    for block in reversed(blocks):
+      entries += block
+    return entries
+
+  def seek(self, start):  #offset of a record at or before given ns since start
+    position = bisect.bisect_right(self.index, (start, self.size)) - 1
+    if position < 0:
+      return capture_header.size
+    return self.index[position][1]
+
+  def duration(self):  #ns since start of the latest data record, only records after the last index entry are read
+    if len(self.index) != 0:
+      offset = self.index[-1][1]
+    else:
+      offset = capture_header.size
+    last = 0
+    for now, kind, port, flags, payload in self.records(offset=offset, data_only=True):
+      last = max(last, now)
+    return last
+
+  def records(self, start=None, end=None, offset=None, data_only=False):  #yields (ns, type, port, flags, payload)
+    view = memoryview(self.map)
+    if offset is None:
+      offset = capture_header.size
+      if start is not None:
+        offset = self.seek(start)
+    limit = self.end
+    unpack = capture_record.unpack_from
+    header_size = capture_record.size
+    released = offset - offset % mmap.PAGESIZE
+    while offset + header_size <= limit:
+      if offset - released >= 16777216 and hasattr(mmap, 'MADV_DONTNEED'):  #keep memory use flat on long scans
+        self.map.madvise(mmap.MADV_DONTNEED, released, 16777216)
+        released += 16777216
+      kind, port, flags, size, now = unpack(self.map, offset)
+      payload_start = offset + header_size
+      offset = payload_start + size
+      if offset > limit:
+        break
+      if end is not None and now > end:
+        break
+      if start is not None and now < start:
+        continue
+      if data_only and kind != capture_rx and kind != capture_tx:
+        continue
+      yield now, kind, port, flags, view[payload_start:offset]
+
+
+#Received data formatting
+rx_invalid_labels = ['\033[2m[\033[0m\033[95m' + hex(i) + '\033[0m\033[2m]\033[0m' for i in range(256)]
+rx_tables = {
+  'char': [chr(i) if i < 128 else rx_invalid_labels[i] for i in range(256)],
+  'hex': [hex(i) + ' ' for i in range(256)],
+  'dec': [str(i) + ' ' for i in range(256)],
+  'bin': [bin(i) + ' ' for i in range(256)],
+  'dechex': [str(i) + ' (' + hex(i) + ') ' for i in range(256)],
+  'binhex': [bin(i) + ' (' + hex(i) + ') ' for i in range(256)]
+}
+rx_tables['char'][10] = ''  #new line is shown by starting a new line
+rx_widths = {}
+for rx_mode in rx_tables:
+  rx_widths[rx_mode] = [len(ansi_escape.sub('', label)) for label in rx_tables[rx_mode]]
+rx_quote = '\033[2m\'\033[0m'
+
+
+def get_rx_mode():
+  if char:
+    return 'char'
+  if dec_ow:
+    return 'dechex' if hex_add else 'dec'
+  if bin_ow:
+    return 'binhex' if hex_add else 'bin'
+  return 'hex'
+
+
+class RxFormatter:
+  def __init__(self, label='', title='Got:', color='\033[36m'):
+    self.label = label  #port tag shown before received data in multi-port sessions
+    self.title = color + label + title + '\033[0m '
+    self.byte_counter = 0  #bytes on current line, 0 when there is no line
+    self.received_invalid = False
+    self.quoted = False
+    self.line_width = 0  #visible columns taken by the line, without closing quote
+    self.on_screen = False
+
+  def end_line(self):
+    self.byte_counter = 0
+    self.received_invalid = False
+    self.on_screen = False
+
+  def split(self, data, char_mode, new_line):  #returns (start, end, starts a new line) for each piece of a line
+    pieces = []
+    size = len(data)
+    count = self.byte_counter
+    invalid = self.received_invalid
+    fresh = new_line or count == 0
+    if fresh:
+      count = 0
+      invalid = False
+    start = 0
+    if not char_mode:  #16 bytes per line
+      while start < size:
+        if count == 16:
+          fresh = True
+          count = 0
+        take = min(16 - count, size - start)
+        pieces.append((start, start + take, fresh))
+        fresh = False
+        start += take
+        count += take
+    elif data.isascii():  #only line ends and the 64 byte limit, line ends can be searched
+      while start < size:
+        if count == 64 or (invalid and count == 16):
+          fresh = True
+          count = 0
+          invalid = False
+        limit = 16 if invalid and count < 16 else 64
+        line_end = data.find(b'\n', start, start + limit - count)
+        if line_end == -1:
+          take = min(limit - count, size - start)
+          pieces.append((start, start + take, fresh))
+          fresh = False
+          start += take
+          count += take
+        else:
+          if line_end != start:
+            pieces.append((start, line_end, fresh))
+          pieces.append((line_end, line_end + 1, True))
+          fresh = False
+          start = line_end + 1
+          count = 1
+          invalid = False
+    else:
+      piece_fresh = False
+      for i in range(size):
+        val = data[i]
+        if val > 127:
+          invalid = True
+        if (fresh and i == 0) or val == 10 or count == 64 or (invalid and count == 16):
+          if i != start:
+            pieces.append((start, i, piece_fresh))
+          start = i
+          piece_fresh = True
+          count = 0
+          invalid = False
+        count += 1
+      pieces.append((start, size, piece_fresh))
+    self.byte_counter = count
+    self.received_invalid = invalid
+    return pieces
+
+  def render(self, data, new_line, stamp=None):  #returns terminal output for a received chunk
+    if stamp is None:
+      stamp = get_now()
+    mode = get_rx_mode()
+    table = rx_tables[mode]
+    widths = rx_widths[mode]
+    data = bytes(data)
+    out = []
+    first = True
+    for start, end, fresh in self.split(data, mode == 'char', new_line):
+      part = data[start:end]
+      if fresh:
+        header = stamp + ' ' + self.title
+        self.quoted = mode == 'char'
+        self.line_width = len(ansi_escape.sub('', header))
+        if first:
+          out.append('\r')  #write over the input symbol
+        out.append(header)
+        if self.quoted:
+          out.append(rx_quote)
+          self.line_width += 1
+      else:  #go back to the end of the line on screen
+        out.append('\033[F\033[' + str(self.line_width + 1) + 'G')
+      out.append(''.join(map(table.__getitem__, part)))
+      self.line_width += sum(map(widths.__getitem__, part))
+      if self.quoted:
+        out.append(rx_quote)
+      out.append('\n')
+      first = False
+    self.on_screen = True
+    return ''.join(out)
+
+
+#Framing
+class Framer:  #splits a byte stream into frames on a delimiter, works on whole chunks
+  def __init__(self, delimiter, max_size=65536, keep_empty=False):
+    self.delimiter = delimiter
+    self.max_size = max_size  #longer frames are reported as errors and dropped
+    self.keep_empty = keep_empty
+    self.partial = bytearray()
+
+  def reset(self):  #bytes are lost, partial frame cannot be completed
+    self.partial = bytearray()
+
+  def decode(self, frame):  #returns (payload, error)
+    return frame, None
+
+  def feed(self, data):  #returns (frame, error) for each frame completed by data
+    search_start = max(0, len(self.partial) - len(self.delimiter) + 1)
+    self.partial += data
+    frames = []
+    if self.partial.find(self.delimiter, search_start) == -1:
+      if len(self.partial) > self.max_size:
+        frames.append((bytes(self.partial[:self.max_size]), 'frame longer than ' + str(self.max_size) + ' bytes'))
+        self.partial = bytearray()
+      return frames
+    parts = self.partial.split(self.delimiter)
+    self.partial = parts.pop()
+    for part in parts:
+      if len(part) == 0 and not self.keep_empty:
+        continue
+      if len(part) > self.max_size:
+        frames.append((bytes(part[:self.max_size]), 'frame longer than ' + str(self.max_size) + ' bytes'))
+        continue
+      frames.append(self.decode(bytes(part)))
+    return frames
+
+
+class LineFramer(Framer):
+  def __init__(self, delimiter=b'\n', max_size=65536):
+    super().__init__(delimiter, max_size, True)
+
+  def describe(self):
+    return 'delimited by ' + self.delimiter.hex(' ')
+
+
+class SlipFramer(Framer):  #RFC 1055
+  def __init__(self, max_size=65536):
+    super().__init__(b'\xc0', max_size)
+
+  def describe(self):
+    return 'SLIP'
+
+  def decode(self, frame):
+    escapes = frame.count(b'\xdb')
+    if escapes == 0:
+      return frame, None
+    if escapes != frame.count(b'\xdb\xdc') + frame.count(b'\xdb\xdd'):
+      return frame, 'invalid escape'
+    return frame.replace(b'\xdb\xdc', b'\xc0').replace(b'\xdb\xdd', b'\xdb'), None
+
+
+class CobsFramer(Framer):  #consistent overhead byte stuffing, frames end with a zero
+  def __init__(self, max_size=65536):
+    super().__init__(b'\x00', max_size)
+
+  def describe(self):
+    return 'COBS'
+
+  def decode(self, frame):
+    payload = bytearray()
+    size = len(frame)
+    position = 0
+    while position < size:  #one step per block of up to 254 bytes
+      code = frame[position]
+      end = position + code
+      if end > size:
+        return bytes(payload + frame[position + 1:]), 'block runs past end of frame'
+      payload += frame[position + 1:end]
+      position = end
+      if code != 0xff and position < size:
+        payload.append(0)
+    return bytes(payload), None
+
+
+class LengthFramer(Framer):  #each frame starts with its length
+  def __init__(self, size=2, byteorder='big', max_size=65536):
+    super().__init__(b'', max_size)
+    self.size = size
+    self.byteorder = byteorder
+
+  def describe(self):
+    return str(self.size) + ' byte ' + self.byteorder + ' endian length prefix'
+
+  def feed(self, data):
+    self.partial += data
+    buffer = self.partial
+    frames = []
+    position = 0
+    while len(buffer) - position >= self.size:
+      length = int.from_bytes(buffer[position:position + self.size], self.byteorder)
+      if length > self.max_size:  #out of sync, try again from next byte
+        frames.append((bytes(buffer[position:position + self.size]), 'length ' + str(length) + ' is too long'))
+        position += 1
+        continue
+      end = position + self.size + length
+      if end > len(buffer):
+        break
+      frames.append((bytes(buffer[position + self.size:end]), None))
+      position = end
+    del buffer[:position]
+    return frames
+
+
+def make_framer(args):  #raises ValueError for unknown framers
+  if args[0] == 'slip':
+    return SlipFramer()
+  if args[0] == 'cobs':
+    return CobsFramer()
+  if args[0] == 'line':
+    if len(args) == 1:
+      return LineFramer()
+    return LineFramer(bytes(int(item, 16) for item in args[1:]))
+  if args[0] == 'len':
+    size = 2
+    byteorder = 'big'
+    for item in args[1:]:
+      if item in ('1', '2', '4'):
+        size = int(item)
+      elif item in ('big', 'little'):
+        byteorder = item
+      else:
+        raise ValueError
+    return LengthFramer(size, byteorder)
+  raise ValueError
+
+
+class FrameStage:  #splits received data of a port into frames on its own thread
+  def __init__(self, uart_port, framer, ready, backlog=1024):
+    self.framer = framer
+    self.ready = ready  #renderer is woken up when frames are ready
+    self.backlog = backlog  #frames waiting to be shown, older ones are dropped
+    self.consumer = uart_port.ring.add_consumer('frames')
+    self.ring = uart_port.ring
+    self.marks = collections.deque()  #(end position, time) of each received chunk, added before commit
+    self.frames = collections.deque()  #(time, frame, error) to be shown
+    self.clock_offset = time.time_ns() - time.monotonic_ns()  #frames are shown with wall clock time
+    self.tag = uart_port.tag
+    self.frame_count = 0
+    self.error_count = 0
+    self.dropped = 0
+    self.running = True
+    self.thread = threading.Thread(target=self.process_loop, daemon=True)
+    self.thread.start()
+
+  def received(self, end, now):  #called by the listener
+    self.marks.append((end, now))
+
+  def stop(self):
+    self.running = False
+    self.ring.remove_consumer(self.consumer)
+    self.consumer.ready.set()
+
+  def take(self, now, completed):
+    for frame, error in completed:
+      self.frame_count += 1
+      if error is not None:
+        self.error_count += 1
+        log_write('frame error on ' + self.tag + ': ' + error + ', ' + frame.hex(' '), 'error')
+      self.frames.append((now + self.clock_offset, frame, error))
+    while len(self.frames) > self.backlog:
+      self.frames.popleft()
+      self.dropped += 1
+
+  def process(self):
+    overflow = self.consumer.overflow
+    data = self.consumer.read()
+    if self.consumer.overflow != overflow:
+      self.framer.reset()
+      self.take(time.monotonic_ns(), [(b'', str(self.consumer.overflow - overflow) + ' bytes lost')])
+    if len(data) == 0:
+      return
+    end = self.consumer.cursor
+    start = end - len(data)
+    position = start
+    marks = self.marks
+    while len(marks) != 0 and marks[0][0] <= end:
+      mark_end, now = marks.popleft()
+      if mark_end <= position:
+        continue
+      self.take(now, self.framer.feed(data[position - start:mark_end - start]))
+      position = mark_end
+    if position < end:  #received while framing was starting, before marks were taken
+      self.take(time.monotonic_ns(), self.framer.feed(data[position - start:]))
+    self.ready.set()
+
+  def process_loop(self):
+    while self.running:
+      self.consumer.wait()
+      if self.running:
+        stage_profiler = profiler
+        stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+        self.process()
+        if stage_profiler is not None:
+          stage_profiler.record('frames', stage_start)
+
+
+#Triggers
+trigger_actions = ('bell', 'log', 'dump', 'nodump', 'send')
+trigger_window = 256  #longest expression match that is found across chunk boundaries
+
+
+def parse_pattern(arg):  #hex bytes or re:<expression>, returns (kind, pattern)
+  if arg.startswith('re:'):
+    pattern = arg[3:].encode('latin-1')
+    kind = 're'
+  else:
+    pattern = bytes.fromhex(arg[2:] if arg.startswith('0x') else arg)
+    kind = 'hex'
+  if len(pattern) == 0:
+    raise ValueError('Empty pattern')
+  return kind, pattern
+
+
+def pattern_expression(kind, pattern):  #expressions are grouped so that they can be joined as alternatives
+  if kind == 'hex':
+    return re.escape(pattern)
+  return b'(?:' + pattern + b')'
+
+
+class Trigger:  #byte sequence or expression searched in received data and action taken on a match
+  def __init__(self, kind, pattern, action, argument=None):
+    self.kind = kind
+    self.pattern = pattern
+    self.action = action
+    self.argument = argument  #bytes to send or dumpfile name
+    self.count = 0
+    self.expression = pattern_expression(kind, pattern)
+    if kind == 'hex':
+      self.span = len(pattern)
+    else:
+      self.span = trigger_window
+    self.matcher = re.compile(self.expression, re.DOTALL)
+    if self.matcher.match(b'') is not None:  #would match at every byte
+      raise ValueError
+
+  def describe(self):
+    if self.kind == 'hex':
+      desc = self.pattern.hex()
+    else:
+      desc = 're:' + self.pattern.decode('latin-1')
+    desc += ' ' + self.action
+    if self.action == 'send':
+      desc += ' ' + self.argument.hex()
+    elif self.action == 'dump':
+      desc += ' ' + self.argument
+    return desc
+
+
+def make_trigger(args):  #raises ValueError for invalid triggers and re.error for invalid expressions
+  if len(args) < 2 or args[1] not in trigger_actions:
+    raise ValueError
+  kind, pattern = parse_pattern(args[0])
+  argument = None
+  if args[1] == 'send':
+    argument = bytes.fromhex(''.join(args[2:]))
+    if len(argument) == 0:
+      raise ValueError
+  elif args[1] == 'dump':
+    if len(args) > 3:
+      raise ValueError
+    argument = args[2] if len(args) == 3 else 'uart_received.bin'
+  elif len(args) > 2:
+    raise ValueError
+  return Trigger(kind, pattern, args[1], argument)
+
+
+class TriggerStage:  #matches all triggers against received data of a port in a single pass on its own thread
+  def __init__(self, uart_port, triggers):
+    self.uart_port = uart_port
+    self.triggers = triggers
+    #a single alternation finds where any trigger matches, triggers are only tried one by one at those bytes
+    self.matcher = re.compile(b'|'.join(trigger.expression for trigger in triggers), re.DOTALL)
+    self.keep = max(trigger.span for trigger in triggers) - 1  #bytes kept for matches across chunks
+    self.tail = b''
+    self.fired = [(-1, 0)] * len(triggers)  #stream range each trigger last matched, an occurrence is only taken once
+    self.consumer = uart_port.ring.add_consumer('triggers')
+    self.ring = uart_port.ring
+    self.running = True
+    self.thread = threading.Thread(target=self.process_loop, daemon=True)
+    self.thread.start()
+
+  def stop(self):
+    self.running = False
+    self.ring.remove_consumer(self.consumer)
+    self.consumer.ready.set()
+
+  def fire(self, index, match_start, match_end, matched):
+    trigger = self.triggers[index]
+    trigger.count += 1
+    uart_port = self.uart_port
+    notice = 'Trigger ' + str(index) + ' matched at byte ' + str(match_start) + ', ' + trigger.action
+    try:
+      if trigger.action == 'bell':
+        notice += '\a'
+      elif trigger.action == 'log':
+        log_write('trigger ' + str(index) + ' on ' + uart_port.tag + ' at byte ' + str(match_start) + ': ' +
+                  matched.hex(' '), 'info')
+      elif trigger.action == 'dump':
+        uart_port.dump_writer.open(working_directory + '/' + get_dump_name(uart_port, trigger.argument), match_start)
+        notice += ' to ' + trigger.argument
+      elif trigger.action == 'nodump':
+        uart_port.dump_writer.close(match_end)
+      elif trigger.action == 'send':
+        uart_port.tx_scheduler.write(trigger.argument)
+    except Exception as action_error:
+      notice += ' failed: ' + str(action_error)
+      log_write('trigger ' + str(index) + ' on ' + uart_port.tag + ' failed: ' + str(action_error), 'error')
+    display = uart_port.display
+    display.notices.append((time.time_ns(), notice))
+    display.consumer.ready.set()
+
+  def process(self):
+    overflow = self.consumer.overflow
+    data = self.consumer.read()
+    if self.consumer.overflow != overflow:  #a match across lost bytes would be wrong
+      self.tail = b''
+    if len(data) == 0:
+      return
+    buffer = self.tail + data
+    fresh = len(self.tail)  #matches ending in the tail were found with the previous chunk
+    start = self.consumer.cursor - len(buffer)
+    search = self.matcher.search
+    match = search(buffer)
+    while match is not None:
+      position = match.start()
+      for index, trigger in enumerate(self.triggers):
+        found = trigger.matcher.match(buffer, position)
+        if found is None or found.end() <= fresh:
+          continue
+        fired_start, fired_end = self.fired[index]
+        if start + position == fired_start:  #a match the previous chunk ended in may be longer now, same occurrence
+          self.fired[index] = (fired_start, max(fired_end, start + found.end()))
+        elif start + position >= fired_end:  #matches starting inside an occurrence are not new ones
+          self.fired[index] = (start + position, start + found.end())
+          self.fire(index, start + position, start + found.end(), found.group())
+      #other triggers may start inside a match, no trigger starts a new occurrence before the end of its last one
+      resume = min(fired_end for fired_start, fired_end in self.fired) - start
+      match = search(buffer, max(position + 1, resume))
+    if self.keep != 0:
+      self.tail = buffer[-self.keep:]
+
+  def process_loop(self):
+    while self.running:
+      self.consumer.wait()
+      if self.running:
+        stage_profiler = profiler
+        stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+        self.process()
+        if stage_profiler is not None:
+          stage_profiler.record('triggers', stage_start)
+
+
+#Terminal renderer
+class RenderSource:  #received data of a single port as seen by the renderer
+  def __init__(self, ring, label, ready):
+    self.label = label
+    self.formatter = RxFormatter(label)
+    self.consumer = ring.add_consumer('display', True, ready)
+    self.marks = collections.deque()  #(position, shown) where a new line starts or muting begins
+    self.showing = True
+    self.stage = None  #FrameStage while received data is shown as frames
+    self.notices = collections.deque(maxlen=1024)  #(time, text) of fired triggers
+    self.error_formatter = RxFormatter(label, 'Bad:', '\033[91m')
+
+  def mark(self, position, shown):  #called by the listener before received bytes are committed
+    self.marks.append((position, shown))
+
+  def segments(self, start, end):  #splits a range of the stream on marks
+    segments = []
+    position = start
+    while position < end:
+      new_line = False
+      while len(self.marks) != 0 and self.marks[0][0] <= position:
+        mark_position, self.showing = self.marks.popleft()
+        new_line = self.showing
+      if len(self.marks) != 0:
+        segment_end = min(end, self.marks[0][0])
+      else:
+        segment_end = end
+      segments.append((position, segment_end, self.showing, new_line))
+      position = segment_end
+    return segments
+
+
+class RxRenderer:
+  def __init__(self, frame_rate=30, frame_limit=4096, notice_limit=16):
+    self.frame_interval = 1 / frame_rate
+    self.frame_limit = frame_limit  #bytes shown from a port in a single frame, rest is elided
+    self.notice_limit = notice_limit  #trigger notices shown from a port in a single frame
+    self.sources = ()
+    self.last_source = None  #only the source that printed last can continue its line
+    self.ready = threading.Event()
+    self.last_frame = 0.0
+    self.thread = threading.Thread(target=self.render_loop, daemon=True)
+    self.thread.start()
+
+  def add_source(self, ring, label=''):
+    source = RenderSource(ring, label, self.ready)
+    self.sources = self.sources + (source,)
+    return source
+
+  def render_frames(self, source, out):
+    frames = source.stage.frames
+    shown = 0
+    elided = 0
+    while len(frames) != 0:
+      now, frame, error = frames.popleft()
+      if listener_mute:
+        continue
+      if shown > self.frame_limit:
+        elided += 1
+        continue
+      shown += len(frame)
+      stamp = get_stamp(datetime.fromtimestamp(now / 1e9))
+      if error is None:
+        out.append(source.formatter.render(frame, True, stamp))
+      else:
+        if len(frame) != 0:
+          out.append(source.error_formatter.render(frame, True, stamp))
+        out.append('\r' + stamp + ' \033[91m' + source.label + 'Frame error: ' + error + '\033[0m\033[K\n')
+    if elided != 0:
+      out.append('\r' + get_now() + ' \033[91m' + source.label + str(elided) + ' frames elided\033[0m\033[K\n')
+    self.last_source = None
+
+  def render_notices(self, source, out):
+    notices = source.notices
+    shown = 0
+    elided = 0
+    while len(notices) != 0:
+      now, notice = notices.popleft()
+      if listener_mute:
+        continue
+      if shown == self.notice_limit:
+        elided += 1
+        continue
+      shown += 1
+      out.append('\r' + get_stamp(datetime.fromtimestamp(now / 1e9)) + ' \033[93m' + source.label + notice +
+                 '\033[0m\033[K\n')
+    if elided != 0:
+      out.append('\r' + get_now() + ' \033[91m' + source.label + str(elided) + ' trigger notices elided\033[0m\033[K\n')
+    source.formatter.end_line()
+    self.last_source = None
+
+  def render_source(self, source, out):
+    if source.stage is not None:
+      if len(source.stage.frames) != 0:
+        self.render_frames(source, out)
+      return
+    consumer = source.consumer
+    start = consumer.cursor
+    head = consumer.ring.head
+    if head - start > self.frame_limit:  #terminal is behind, only show the latest bytes
+      consumer.skip(head - self.frame_limit)
+    data = consumer.read()
+    data_start = consumer.cursor - len(data)
+    elided = 0
+    for segment_start, segment_end, shown, new_line in source.segments(start, data_start):
+      if shown:
+        elided += segment_end - segment_start
+    if elided != 0:
+      source.formatter.end_line()
+      out.append('\r' + get_now() + ' \033[91m' + source.label + str(elided) + ' bytes elided\033[0m\033[K\n')
+      self.last_source = None
+    for segment_start, segment_end, shown, new_line in source.segments(data_start, consumer.cursor):
+      if not shown:
+        source.formatter.end_line()
+        continue
+      part = data[segment_start - data_start:segment_end - data_start]
+      out.append(source.formatter.render(part, new_line or self.last_source is not source))
+      self.last_source = source
+
+  def render_loop(self):
+    while True:
+      self.ready.wait()
+      wait = self.last_frame + self.frame_interval - time.monotonic()
+      if wait > 0:  #collect everything that arrives until next frame
+        time.sleep(wait)
+      self.last_frame = time.monotonic()
+      self.ready.clear()
+      stage_profiler = profiler
+      stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+      out = []
+      for source in self.sources:
+        self.render_source(source, out)
+        if len(source.notices) != 0:
+          self.render_notices(source, out)
+      if stage_profiler is not None:
+        stage_profiler.record('format', stage_start)
+      if len(out) != 0:
+        if stage_profiler is not None:
+          stage_start = time.perf_counter_ns()
+        print_raw(''.join(out))
+        print_input_symbol()
+        sys.stdout.flush()
+        if stage_profiler is not None:
+          stage_profiler.record('output', stage_start)
+
+
+#Serial ports
+parity_options = {
+  'n': (serial.PARITY_NONE, 'no'), 'no': (serial.PARITY_NONE, 'no'), 'none': (serial.PARITY_NONE, 'no'),
+  'e': (serial.PARITY_EVEN, 'even'), 'even': (serial.PARITY_EVEN, 'even'),
+  'o': (serial.PARITY_ODD, 'odd'), 'odd': (serial.PARITY_ODD, 'odd'),
+  'm': (serial.PARITY_MARK, 'mark'), 'mark': (serial.PARITY_MARK, 'mark'),
+  's': (serial.PARITY_SPACE, 'space'), 'space': (serial.PARITY_SPACE, 'space')
+}
+stop_options = {
+  '1': serial.STOPBITS_ONE, '1.5': serial.STOPBITS_ONE_POINT_FIVE, '1,5': serial.STOPBITS_ONE_POINT_FIVE,
+  '2': serial.STOPBITS_TWO
+}
+
+
+def parse_port_arg(arg):  #tty<name>[:baud[:data size[:parity[:stop bits]]]], empty fields use defaults
+  fields = arg.split(':')
+  if len(fields) > 5:
+    raise ValueError('Too many fields in ' + arg)
+  settings = {'path': '/dev/' + fields[0]}
+  if len(fields) > 1 and fields[1] != '':
+    settings['baud'] = int(fields[1])
+    if settings['baud'] < 1200:
+      raise ValueError('Minimum baud rate should be 1.2k')
+  if len(fields) > 2 and fields[2] != '':
+    settings['data_size'] = int(fields[2])
+    if not 4 < settings['data_size'] < 9:
+      raise ValueError('Data size should be either 5, 6, 7 or 8')
+  if len(fields) > 3 and fields[3] != '':
+    if fields[3].casefold() not in parity_options:
+      raise ValueError('Parity should be odd, even, mark, space or none')
+    settings['par'], settings['par_str'] = parity_options[fields[3].casefold()]
+  if len(fields) > 4 and fields[4] != '':
+    if fields[4] not in stop_options:
+      raise ValueError('Stop bit size should be either 1, 1.5 or 2')
+    settings['stop_size'] = stop_options[fields[4]]
+  return settings
+
+
+class UartPort:
+  def __init__(self, path, baud_rate, size, parity, parity_name, stop, ring_size):
+    self.path = path
+    if path.startswith('/dev/tty'):
+      self.tag = path[8:]
+    else:
+      self.tag = os.path.basename(path)
+    self.baud = baud_rate
+    self.data_size = size
+    self.par = parity
+    self.par_str = parity_name
+    self.stop_size = stop
+    self.conn = None
+    self.alive = False
+    self.ring = RingBuffer(ring_size)
+    self.display = None
+    self.dump_writer = DumpWriter(self.ring)
+    self.capture = None  #CaptureSource while recording
+    self.framing = None  #FrameStage while received data is split into frames
+    self.triggers = None  #TriggerStage while triggers are set
+    self.expecter = None  #ExpectBuffer in script mode
+    self.rx_checksum = None  #ChecksumStage while received data is checksummed
+    self.tx_scheduler = TxScheduler(get_wire_time(self, 1))
+    self.byte_count = 0
+    self.read_count = 0
+    self.waiting_max = 0  #most bytes seen waiting in the driver before a read
+    self.start_time = time.monotonic()
+    self.stats_checkpoint = (self.start_time, 0, 0)
+    self.timer_stamp = 0
+    self.was_muted = False
+    self.block_count = 0
+
+  def open(self):
+    self.conn = Serial(self.path, self.baud, self.data_size, self.par, self.stop_size)
+    self.tx_scheduler.conn = self.conn
+    self.alive = True
+    self.start_time = time.monotonic()
+    self.stats_checkpoint = (self.start_time, 0, 0)
+
+  def describe(self):
+    return (str(self.baud) + ' ' + str(self.data_size) + ' bits with ' + self.par_str + ' parity and ' +
+            str(self.stop_size) + ' stop bit(s)')
+
+
+def use_port(uart_port):  #commands and data entry act on the active port
+  global active_port
+  global uart_conn
+  global serial_path
+  global baud
+  global data_size
+  global par
+  global par_str
+  global stop_size
+  global tx_scheduler
+  active_port = uart_port
+  uart_conn = uart_port.conn
+  serial_path = uart_port.path
+  baud = uart_port.baud
+  data_size = uart_port.data_size
+  par = uart_port.par
+  par_str = uart_port.par_str
+  stop_size = uart_port.stop_size
+  tx_scheduler = uart_port.tx_scheduler
+
+
+def find_port(name):  #by tag, path or index
+  for uart_port in ports:
+    if name == uart_port.tag or name == uart_port.path or name == uart_port.path[5:]:
+      return uart_port
+  if name.isnumeric() and int(name) < len(ports):
+    return ports[int(name)]
+  return None
+
+
+def set_framing(uart_port, framer):  #None shows received data as it is
+  display = uart_port.display
+  if uart_port.framing is not None:
+    stage = uart_port.framing
+    uart_port.framing = None
+    display.stage = None
+    stage.stop()
+  if framer is None:
+    display.formatter.end_line()
+    display.consumer.activate()
+    return
+  display.consumer.deactivate()
+  stage = FrameStage(uart_port, framer, display.consumer.ready)
+  display.stage = stage
+  uart_port.framing = stage
+
+
+def set_triggers(uart_port, triggers):  #empty tuple stops matching
+  if uart_port.triggers is not None:
+    stage = uart_port.triggers
+    uart_port.triggers = None
+    stage.stop()
+  if len(triggers) != 0:
+    uart_port.triggers = TriggerStage(uart_port, triggers)
+
+
+def get_dump_name(uart_port, filename):  #in multi-port sessions each port dumps to its own tagged file
+  if len(ports) < 2:
+    return filename
+  root, ext = os.path.splitext(filename)
+  return root + '_' + uart_port.tag + ext
+
+
+#Receive engine
+def read_chunk(conn, read_view, uart_port=None):  #high-water mark of waiting bytes is kept for a given port
+  size = len(read_view)
+  waiting = conn.in_waiting
+  if waiting == 0:  #block for at least one byte, then drain whatever followed it
+    received = conn.readinto(read_view[:1])
+    if received == 0:
+      return 0
+    waiting = conn.in_waiting
+    if uart_port is not None and waiting + 1 > uart_port.waiting_max:
+      uart_port.waiting_max = waiting + 1
+    waiting = min(waiting, size - 1)
+    if waiting > 0:
+      received += conn.readinto(read_view[1:waiting + 1])
+    return received
+  if uart_port is not None and waiting > uart_port.waiting_max:
+    uart_port.waiting_max = waiting
+  return conn.readinto(read_view[:min(waiting, size)])
+
+
+def print_rx_stats(uart_port):
+  now = time.monotonic()
+  elapsed = now - uart_port.start_time
+  checkpoint = uart_port.stats_checkpoint
+  interval = now - checkpoint[0]
+  byte_count = uart_port.byte_count
+  if len(ports) > 1:
+    print_info('\033[0m' + uart_port.tag + '\033[2m (' + uart_port.path + '):\n', False)
+  print_info('Received \033[0m' + str(byte_count) + '\033[2m bytes in \033[0m' + str(uart_port.read_count) +
+             '\033[2m reads\n', False)
+  if uart_port.read_count != 0:
+    print_info('Average chunk: \033[0m' + format(byte_count / uart_port.read_count, '.1f') + '\033[2m bytes\n',
+               False)
+  if elapsed > 0:
+    print_info('Overall rate: \033[0m' + format(byte_count / elapsed, '.1f') + '\033[2m B/s\n', False)
+  if interval > 0:
+    print_info('Since last check: \033[0m' + format((byte_count - checkpoint[1]) / interval, '.1f') +
+               '\033[2m B/s, \033[0m' + format((uart_port.read_count - checkpoint[2]) / interval, '.1f') +
+               '\033[2m reads/s\n', False)
+  uart_port.stats_checkpoint = (now, byte_count, uart_port.read_count)
+  print_info('Most bytes waiting in driver: \033[0m' + str(uart_port.waiting_max) + '\033[2m, buffered for dump: \033[0m' +
+             str(len(uart_port.dump_writer.buffer)) + '\033[2m bytes\n', False)
+  line_errors = get_line_errors(uart_port.conn)
+  if line_errors is None:
+    print_info('Line errors are not reported by the driver\n', False)
+  else:
+    print_info('Line errors: frame \033[0m' + str(line_errors['frame']) + '\033[2m, parity \033[0m' +
+               str(line_errors['parity']) + '\033[2m, overrun \033[0m' + str(line_errors['overrun']) +
+               '\033[2m, buffer overrun \033[0m' + str(line_errors['buffer_overrun']) + '\033[2m, break \033[0m' +
+               str(line_errors['break']) + '\n', False)
+  for consumer in uart_port.ring.consumers:
+    if not consumer.active:
+      continue
+    print_info('~ ' + consumer.name + ': lag \033[0m' + str(consumer.lag()) + '\033[2m bytes, max lag \033[0m' +
+               str(consumer.max_lag) + '\033[2m bytes, overflow \033[0m' + str(consumer.overflow) + '\033[2m bytes\n',
+               False)
+  if uart_port.framing is not None:
+    stage = uart_port.framing
+    print_info('Frames (' + stage.framer.describe() + '): \033[0m' + str(stage.frame_count) + '\033[2m, errors \033[0m' +
+               str(stage.error_count) + '\033[2m, dropped before shown \033[0m' + str(stage.dropped) + '\n', False)
+  scheduler = uart_port.tx_scheduler
+  print_info('Sent \033[0m' + str(scheduler.byte_count) + '\033[2m bytes, wire time \033[0m' +
+             format(scheduler.wire_time, '.3f') + '\033[2m s, pacing: \033[0m' + scheduler.describe() + '\n', False)
+
+
+def get_line_errors(conn):  #error counts kept by the serial driver, None when the driver does not keep them
+  try:
+    counts = struct.unpack('11i', fcntl.ioctl(conn.fileno(), termios.TIOCGICOUNT, bytes(80))[:44])
+  except Exception:  #ptys, sockets and other platforms
+    return None
+  return {'frame': counts[6], 'overrun': counts[7], 'parity': counts[8], 'break': counts[9], 'buffer_overrun': counts[10]}
+
+
+def get_port_metrics(uart_port):  #counters of a port, rates are taken from differences between samples
+  scheduler = uart_port.tx_scheduler
+  consumers = {}
+  for consumer in uart_port.ring.consumers:
+    if consumer.active:
+      consumers[consumer.name] = {'lag': consumer.lag(), 'max_lag': consumer.max_lag, 'overflow': consumer.overflow}
+  return {
+    'port': uart_port.tag, 'alive': uart_port.alive, 'rx_bytes': uart_port.byte_count, 'rx_reads': uart_port.read_count,
+    'in_waiting_max': uart_port.waiting_max, 'dump_buffered': len(uart_port.dump_writer.buffer),
+    'tx_bytes': scheduler.byte_count, 'tx_wire_time': scheduler.wire_time, 'consumers': consumers,
+    'line_errors': get_line_errors(uart_port.conn)
+  }
+
+
+class MetricsWriter:  #writes a JSON line with metrics of every port periodically
+  def __init__(self, path, interval):
+    self.path = path
+    self.interval = interval
+    self.file = open(path, 'a', buffering=1)
+    self.previous = {}
+    self.running = threading.Event()
+    self.thread = threading.Thread(target=self.write_loop, daemon=True)
+    self.thread.start()
+
+  def stop(self):
+    self.running.set()
+    self.thread.join()
+    self.file.close()
+
+  def sample(self):
+    now = time.monotonic()
+    sample = {'time': datetime.now().isoformat(), 'ports': []}
+    for uart_port in ports:
+      metrics = get_port_metrics(uart_port)
+      previous = self.previous.get(uart_port.tag)
+      if previous is not None:
+        elapsed = now - previous[0]
+        reads = metrics['rx_reads'] - previous[1]['rx_reads']
+        received = metrics['rx_bytes'] - previous[1]['rx_bytes']
+        metrics['rx_rate'] = received / elapsed
+        metrics['reads_per_s'] = reads / elapsed
+        metrics['chunk_avg'] = received / reads if reads != 0 else 0
+        metrics['tx_rate'] = (metrics['tx_bytes'] - previous[1]['tx_bytes']) / elapsed
+      self.previous[uart_port.tag] = (now, metrics)
+      sample['ports'].append(metrics)
+    self.file.write(json.dumps(sample) + '\n')
+
+  def write_loop(self):
+    while not self.running.wait(self.interval):
+      try:
+        self.sample()
+      except Exception as metrics_error:
+        log_write('cannot write metrics to ' + self.path + ': ' + str(metrics_error), 'error')
+        return
+
+
+def port_received(uart_port, received):  #bookkeeping for bytes read into the writable region of port's ring
+  global block_listener
+  global listener_block_count
+  stage_profiler = profiler
+  stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+  if block_listener:  #a command printed something, every port should start a new line
+    block_listener = False
+    listener_block_count += 1
+  uart_port.byte_count += received
+  uart_port.read_count += 1
+  if listener_mute:
+    if not uart_port.was_muted:
+      uart_port.display.mark(uart_port.ring.head, False)
+  else:
+    #only a gap between reads times out a line
+    if uart_port.block_count != listener_block_count or uart_port.was_muted or uart_port.timer_stamp < get_cpu_time():
+      uart_port.display.mark(uart_port.ring.head, True)
+    uart_port.block_count = listener_block_count
+    uart_port.timer_stamp = get_cpu_time() + 100000
+  uart_port.was_muted = listener_mute
+  capture = uart_port.capture
+  if capture is not None:
+    capture.received(uart_port.ring.head + received, time.monotonic_ns())
+  framing = uart_port.framing
+  if framing is not None:
+    framing.received(uart_port.ring.head + received, time.monotonic_ns())
+  uart_port.ring.commit(received)
+  if stage_profiler is not None:
+    stage_profiler.record('receive', stage_start)
+
+
+def port_lost(uart_port, listener_error):
+  global listener_alive
+  uart_port.alive = False
+  if listener_closing:
+    return
+  if isinstance(listener_error, (serial.SerialException, OSError)):
+    print_fatal('\033[F\nConnection to ' + uart_port.path + ' lost!\n')
+  else:
+    print_fatal(str(listener_error) + '\n')
+  for other_port in ports:
+    if other_port.alive:
+      return
+  print_warn('Killing daemon...\n')
+  listener_alive = False
+
+
+#listener daemon
+def uart_listener(uart_port):  #? if possible, keep the prompt already written in terminal when new received
+  while True:  #main loop for listener
+    try:
+      stage_profiler = profiler
+      stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+      received = read_chunk(uart_port.conn, uart_port.ring.writable(rx_chunk_size), uart_port)
+      if stage_profiler is not None:
+        stage_profiler.record('read', stage_start)
+      if received != 0:
+        port_received(uart_port, received)
+    except Exception as listener_error:
+      port_lost(uart_port, listener_error)
+      break
+
+
+def multi_listener(port_list):  #a single thread serves every port that can be polled
+  selector = selectors.DefaultSelector()
+  for uart_port in port_list:
+    selector.register(uart_port.conn.fileno(), selectors.EVENT_READ, uart_port)
+  while len(selector.get_map()) != 0:
+    for key, events in selector.select():
+      uart_port = key.data
+      try:
+        stage_profiler = profiler
+        stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+        waiting = uart_port.conn.in_waiting
+        if waiting > uart_port.waiting_max:
+          uart_port.waiting_max = waiting
+        waiting = max(1, min(waiting, rx_chunk_size))  #empty read raises if device is gone
+        received = uart_port.conn.readinto(uart_port.ring.writable(waiting))
+        if stage_profiler is not None:
+          stage_profiler.record('read', stage_start)
+        if received != 0:
+          port_received(uart_port, received)
+      except Exception as listener_error:
+        selector.unregister(key.fd)
+        port_lost(uart_port, listener_error)
+
+
+def start_listeners(port_list):
+  print_raw(get_now())
+  print_info(' Listening...\n')
+  polled = []
+  for uart_port in port_list:
+    try:
+      uart_port.conn.fileno()
+      polled.append(uart_port)
+    except Exception:  #ports without a file descriptor get their own blocking reader
+      threading.Thread(target=uart_listener, args=[uart_port], daemon=True).start()
+  if len(polled) != 0:
+    threading.Thread(target=multi_listener, args=[polled], daemon=True).start()
+
+
+#Input handling
+def process_input(cin):  #handles a single line of user input, returns False when user wants to quit
+  global block_listener
+  global char
+  global dec_ow
+  global bin_ow
+  global hex_add
+  global safe_tx
+  global prefix
+  global suffix
+  global tx_bytewise
+  global keep_log
+  global listener_mute
+  global working_directory
+  global dumpfile
+  global tx_chunk_size
+  global program_log
+  global checksum_names
+  global traffic_generator
+  global ber_checker
+  global metrics_writer
+  global profiler
+  cin = cin.strip()
+  if cin == '':
+    print_time_stamp()  #print timestamp
+    print_info('Nothing to do!\n', False)
+    print_input_symbol()
+    return True
+
+  #command handling
+  if cin == '\\quit' or cin == '\\exit' or cin == '\\q':
+    print_time_stamp()  #print timestamp
+    return False
+  elif cin == '\\help':
+    print_time_stamp()  #print timestamp
+    print_info('Help\n', False)
+    print_help()
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin == '\\license':
+    print_time_stamp()  #print timestamp
+    print_info('License\n', False)
+    print_raw('EUPL-1.2\n')
+    print_raw('Full text: https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin == '\\char' or cin == '\\c':
+    char = True
+    dec_ow = False
+    bin_ow = False
+    hex_add = False
+    print_time_stamp()  #print timestamp
+    print_info('Received bytes will be printed as character\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin == '\\hex' or cin == '\\h':
+    print_time_stamp()  #print timestamp
+    print_info('Received bytes will be printed as hexadecimal number\n')
+    block_listener = True
+    char = False
+    dec_ow = False
+    bin_ow = False
+    hex_add = False
+    print_input_symbol()
+    return True
+  elif cin == '\\dec':
+    print_time_stamp()  #print timestamp
+    print_info('Received bytes will be printed as decimal number\n')
+    block_listener = True
+    char = False
+    dec_ow = True
+    bin_ow = False
+    hex_add = False
+    print_input_symbol()
+    return True
+  elif cin == '\\bin':
+    print_time_stamp()  #print timestamp
+    print_info('Received bytes will be printed as binary number\n')
+    block_listener = True
+    char = False
+    dec_ow = False
+    bin_ow = True
+    hex_add = False
+    print_input_symbol()
+    return True
+  elif cin == '\\dechex':
+    print_time_stamp()  #print timestamp
+    print_info('Received bytes will be printed as decimal number and hexadecimal equivalent\n')
+    block_listener = True
+    char = False
+    dec_ow = True
+    bin_ow = False
+    hex_add = True
+    print_input_symbol()
+    return True
+  elif cin == '\\binhex':
+    print_time_stamp()  #print timestamp
+    print_info('Received bytes will be printed as binary number and hexadecimal equivalent\n')
+    block_listener = True
+    char = False
+    dec_ow = False
+    bin_ow = True
+    hex_add = True
+    print_input_symbol()
+    return True
+  elif cin == '\\@':
+    print_time_stamp()  #print timestamp
+    print_info('Connected to: \033[0m' + serial_path + '\n')
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\port'):
+    arg = cin[5:].strip().split(' ')
+    print_time_stamp()  #print timestamp
+    if arg[0] != '':
+      uart_port = find_port(arg[0])
+      if uart_port is None:
+        print_error('No open device \033[0m' + arg[0] + '\033[31m!\n', False)
+        print_input_symbol()
+        return True
+      if not uart_port.alive:
+        print_error('Connection to \033[0m' + uart_port.path + '\033[31m is lost!\n', False)
+        print_input_symbol()
+        return True
+      if len(arg) != 1:
+        print_warn('Ignoring extra arguments\n', False)
+      use_port(uart_port)
+      print_info('Sending to \033[0m' + serial_path + '\n')
+    else:
+      print_info('Open devices:\n', False)
+    for index in range(len(ports)):
+      uart_port = ports[index]
+      print_info('~ ' + str(index) + ': ', False)
+      if uart_port is active_port:
+        print_raw('\033[32m' + uart_port.path + '\033[0m')
+      elif uart_port.alive:
+        print_raw(uart_port.path)
+      else:
+        print_error(uart_port.path + ', connection lost', False)
+      print_info(' (' + uart_port.tag + ') ' + uart_port.describe() + '\n', False)
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin == '\\keeplog':
+    print_time_stamp()  #print timestamp
+    if program_log is not None:
+      keep_log = True
+      print_info('Programme log will be kept\n')
+    else:
+      try:
+        program_log = log_directory + '/uart_' + start_time.strftime('%Y%m%dh%Hm%Ms%S') + '.log'
+        log = open(program_log, 'a')
+        log.write(get_log_time(start_time))
+        log.write('program start\n')
+        log.write(get_log_time(datetime.now()))
+        log.write('log start, tool run without a log!\n')
+        log.close()
+        print_info('New log generated\n')
+        keep_log = True
+      except Exception as e:
+        print_error('Cannot keep log\n')
+        print_error(str(e)+'\n')
+    print_input_symbol()
+    return True
+  elif cin == '\\safe':
+    print_time_stamp()  #print timestamp
+    print_info('Safe transmit mode enabled\n')
+    block_listener = True
+    safe_tx = True
+    print_input_symbol()
+    return True
+  elif cin == '\\bytewise':
+    print_time_stamp()  #print timestamp
+    print_info('Data will be written byte by byte\n')
+    block_listener = True
+    tx_bytewise = True
+    print_input_symbol()
+    return True
+  elif cin == '\\nobytewise':
+    print_time_stamp()  #print timestamp
+    print_info('Data will be written in a single write per line\n')
+    block_listener = True
+    tx_bytewise = False
+    print_input_symbol()
+    return True
+  elif cin == '\\unsafe':
+    print_time_stamp()  #print timestamp
+    print_info('Safe transmit mode disabled\n')
+    block_listener = True
+    safe_tx = False
+    print_input_symbol()
+    return True
+  elif cin == '\\unmute':
+    print_time_stamp()  #print timestamp
+    print_info('Listener unmuted\n')
+    listener_mute = False
+    print_input_symbol()
+    return True
+  elif cin == '\\mute':
+    print_time_stamp()  #print timestamp
+    print_info('Listener muted\n')
+    listener_mute = True
+    if dumpfile is None:
+      print_warn('Dumping is disabled, received data will be discarded!\n')
+    print_input_symbol()
+    return True
+  elif cin == '\\nodump':
+    print_time_stamp()  #print timestamp
+    print_info('Dumping disabled\n')
+    dumpfile = None
+    for uart_port in ports:
+      uart_port.dump_writer.close()
+    if listener_mute:
+      print_warn('Listener is muted, received data will be discarded!\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\dump'):
+    cin = cin[5:]
+    tmp_file = None
+    cin = cin.split(' ')
+    print_time_stamp()  #print timestamp
+    if len(cin) == cin.count(''):
+      tmp_file = 'uart_received.bin'
+    else:
+      for arg in cin:
+        if arg != '':
+          if tmp_file is None:
+            tmp_file = arg
+          else:
+            print_warn('Ignoring extra arguments\n', False)
+            break
+    if not os.path.isfile(working_directory + '/' + get_dump_name(active_port, tmp_file)):
+      try:
+        tmp_dump = open(working_directory + '/' + get_dump_name(active_port, tmp_file), 'x')
+        tmp_dump.close()
+      except Exception as e:
+        print_error('Cannot find or create file \033[0m' + tmp_file + '\033[31m in current path!\n')
+        print_error(str(e) + '\n')
+        print_input_symbol()
+        return True
+    try:
+      for uart_port in ports:
+        uart_port.dump_writer.open(working_directory + '/' + get_dump_name(uart_port, tmp_file))
+      dumpfile = tmp_file
+      print_info('Received bytes will be dumped to \033[0m' + dumpfile + '\n')
+      if len(ports) > 1:
+        print_info('Port tag is appended to the file name of each port\n', False)
+    except Exception as open_error:
+      print_error('Cannot open file \033[0m' + tmp_file + '\033[31m!\n')
+      print_error(str(open_error)+'\n')
+      dumpfile = None
+      for uart_port in ports:
+        uart_port.dump_writer.close()
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\frame'):
+    arg = cin[6:].strip().split(' ')
+    print_time_stamp()  #print timestamp
+    if arg[0] == 'off':
+      set_framing(active_port, None)
+    elif arg[0] != '':
+      try:
+        set_framing(active_port, make_framer(arg))
+      except ValueError:
+        print_error('Usage: \\frame [slip | cobs | line [delimiter bytes] | len [1|2|4] [big|little] | off]\n', False)
+        print_input_symbol()
+        return True
+    if active_port.framing is None:
+      print_info('Received data is shown as it is\n')
+    else:
+      print_info('Received data is shown as frames, \033[0m' + active_port.framing.framer.describe() + '\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\trigger'):
+    arg = [item for item in cin[8:].split(' ') if item != '']
+    print_time_stamp()  #print timestamp
+    if len(arg) == 0:
+      print_info('Triggers:\n', False)
+    elif arg[0] == 'clear':
+      if len(arg) != 1:
+        print_warn('Ignoring extra arguments\n', False)
+      trigger_list.clear()
+      print_info('Triggers cleared\n')
+    elif arg[0] == 'del':
+      if len(arg) != 2 or not arg[1].isnumeric() or int(arg[1]) >= len(trigger_list):
+        print_error('Usage: \\trigger del <index>\n', False)
+        print_input_symbol()
+        return True
+      print_info('Removed trigger \033[0m' + trigger_list.pop(int(arg[1])).describe() + '\n')
+    else:
+      try:
+        trigger_list.append(make_trigger(arg))
+      except (ValueError, re.error):
+        print_error('Usage: \\trigger [<hex bytes> | re:<expression>] [bell | log | dump [filename] | nodump | ' +
+                    'send <hex bytes>] or \\trigger [del <index> | clear]\n', False)
+        print_input_symbol()
+        return True
+      print_info('Added trigger \033[0m' + trigger_list[-1].describe() + '\n')
+    if len(arg) != 0:
+      for uart_port in ports:
+        set_triggers(uart_port, tuple(trigger_list))
+    for index, trigger in enumerate(trigger_list):
+      print_info('~ ' + str(index) + ': \033[0m' + trigger.describe() + '\033[2m, matched \033[0m' +
+                 str(trigger.count) + '\033[2m times\n', False)
+    if len(trigger_list) == 0:
+      print_info('~ none\n', False)
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\crc'):
+    arg = cin[4:].strip().split(' ')
+    print_time_stamp()  #print timestamp
+    if arg[0] in ('reset', 'on', 'off') and len(arg) != 1:
+      print_warn('Ignoring extra arguments\n', False)
+    if arg[0] == 'reset':
+      for uart_port in ports:
+        if uart_port.rx_checksum is not None:
+          uart_port.rx_checksum.checksums.reset()
+        uart_port.tx_scheduler.checksums.reset()
+      print_info('Checksums reset\n')
+    elif arg[0] == 'on':
+      for uart_port in ports:
+        if uart_port.rx_checksum is None:
+          uart_port.rx_checksum = ChecksumStage(uart_port.ring, checksum_names)
+      print_info('Received data is checksummed from now on\n')
+    elif arg[0] == 'off':
+      for uart_port in ports:
+        if uart_port.rx_checksum is not None:
+          uart_port.rx_checksum.stop()
+          uart_port.rx_checksum = None
+      print_info('Received data is not checksummed anymore\n')
+    elif arg[0] != '':
+      for name in arg:
+        if name not in checksum_algorithms:
+          print_error('Unknown checksum \033[0m' + name + '\033[31m, available: ' + ', '.join(checksum_algorithms) +
+                      '\n', False)
+          print_input_symbol()
+          return True
+      checksum_names = tuple(dict.fromkeys(arg))
+      for uart_port in ports:
+        if uart_port.rx_checksum is not None:
+          uart_port.rx_checksum.checksums.select(checksum_names)
+        uart_port.tx_scheduler.checksums.select(checksum_names)
+      print_info('Checksums set to \033[0m' + ', '.join(checksum_names) + '\n')
+    else:
+      print_info('Checksums since last reset\n', False)
+    for uart_port in ports:
+      label = ''
+      if len(ports) > 1:
+        label = uart_port.tag + ' '
+      tx_checksums = uart_port.tx_scheduler.checksums
+      if uart_port.rx_checksum is None:
+        print_info(label + 'Received data is not checksummed, start with \\crc on\n', False)
+      else:
+        rx_checksums = uart_port.rx_checksum.checksums
+        print_info(label + 'Received \033[0m' + str(rx_checksums.size) + '\033[2m bytes: ' + rx_checksums.describe() +
+                   '\n', False)
+        if rx_checksums.lost != 0:
+          print_warn(label + str(rx_checksums.lost) + ' received bytes were lost, checksums are not valid!\n', False)
+      print_info(label + 'Sent \033[0m' + str(tx_checksums.size) + '\033[2m bytes: ' + tx_checksums.describe() + '\n',
+                 False)
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin == '\\norecord':
+    print_time_stamp()  #print timestamp
+    if capture_writer.path is None:
+      print_warn('Not recording\n', False)
+    else:
+      path = capture_writer.path
+      capture_writer.close()
+      print_info('Recording stopped, \033[0m' + str(capture_writer.record_count) + '\033[2m records written to \033[0m' +
+                 os.path.basename(path) + '\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\record'):
+    arg = cin[7:].strip().split(' ')
+    print_time_stamp()  #print timestamp
+    if arg[0] == '':
+      tmp_file = 'uart_capture.ucap'
+    else:
+      tmp_file = arg[0]
+      if len(arg) != 1:
+        print_warn('Ignoring extra arguments\n', False)
+    try:
+      capture_writer.open(working_directory + '/' + tmp_file, ports)
+      print_info('Received and transmitted data will be recorded to \033[0m' + tmp_file + '\n')
+    except Exception as open_error:
+      print_error('Cannot open file \033[0m' + tmp_file + '\033[31m!\n')
+      print_error(str(open_error)+'\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\send') or cin.startswith('\\s ') or cin == '\\s':
+    sendByte = 0
+    sendFile = 0
+    if cin.strip() == '\\send' or cin.strip() == '\\s':
+      block_listener = True
+      files = read_line('Please provide the name of the file(s): ')
+    else:
+      if cin.startswith('\\send'):
+        cin = cin[5:]
+      else:
+        cin = cin[2:]
+      files = cin.strip()
+    files = files.split(' ')
+    send_start = time.monotonic()
+    wire_start = tx_scheduler.wire_time
+    for filename in files:
+      if filename != '':
+        file = None
+        try:
+          full_path = working_directory + '/' + filename
+          file = open(full_path, 'rb')
+          sendFile += 1
+        except Exception as open_err:
+          print_time_stamp()  #print timestamp
+          print_error('Cannot open file \033[0m' + filename + '\033[31m!\n')
+          print_error(str(open_err) + '\n')
+          if safe_tx:
+            print_info('Breaking\n')
+            break
+          else:
+            print_info('Continuing\n')
+            continue
+        file_checksums = ChecksumSet(checksum_names)
+        try:
+          sent_all = send_file(file, filename, file_checksums)
+        except Exception as send_err:
+          sent_all = False
+          print_time_stamp()  #print timestamp
+          print_error('Cannot send file \033[0m' + filename + '\033[31m!\n')
+          print_error(str(send_err) + '\n')
+        finally:
+          sendByte += file_checksums.size  #bytes actually written, also when the send was interrupted
+          file.close()
+        print_time_stamp()  #print timestamp
+        if sent_all:
+          print_info('Sent \033[0m' + filename + '\033[2m, ' + str(file_checksums.size) + ' bytes, ' +
+                     file_checksums.describe() + '\n')
+        else:
+          print_error('Sent only \033[0m' + str(file_checksums.size) + '\033[31m bytes of \033[0m' + filename +
+                      '\033[31m!\n')
+          if safe_tx:
+            print_info('Breaking\n')
+            break
+    send_time = time.monotonic() - send_start
+    print_time_stamp()  #print timestamp
+    if sendFile == 0:
+      print_warn("Didn't write anything\n")
+    else:
+      print_info('Wrote ' + str(sendByte) + ' bytes from ' + str(sendFile) + ' file(s)')
+      if send_time > 0:
+        print_info(' in ' + format(send_time, '.2f') + ' s, \033[0m' + format(sendByte / send_time, '.0f') +
+                   '\033[2m B/s')
+      print_info(' (wire time ' + format(tx_scheduler.wire_time - wire_start, '.2f') + ' s)')
+      print_raw('\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\rand') or cin.startswith('\\r ') or cin == '\\r':
+    if cin.startswith('\\rand'):
+      arg = [item for item in cin[5:].split(' ') if item != '']
+    else:
+      arg = [item for item in cin[2:].split(' ') if item != '']
+    print_time_stamp()  #print timestamp
+    if len(arg) != 0 and arg[0] == 'stop':
+      if traffic_generator is None:
+        print_warn('Traffic generator is not running\n', False)
+      else:
+        generator = traffic_generator
+        traffic_generator = None
+        elapsed = generator.stop()
+        print_info('Traffic generator stopped, sent \033[0m' + str(generator.sent) + '\033[2m bytes of ' +
+                   generator.source.pattern + ' in ' + format(elapsed, '.2f') + ' s')
+        if elapsed > 0:
+          print_info(', \033[0m' + format(generator.sent / elapsed, '.0f') + '\033[2m B/s')
+        print_raw('\n')
+        if generator.error is not None:
+          print_error(str(generator.error) + '\n')
+      block_listener = True
+      print_input_symbol()
+      return True
+    random_byte_count = 1
+    pattern = 'random'
+    seed = None
+    try:
+      if len(arg) > 0 and arg[0] != 'cont':
+        random_byte_count = int(arg[0])
+      if len(arg) > 1:
+        pattern = arg[1]
+      if len(arg) > 2:
+        seed = int(arg[2], 0)
+    except ValueError:
+      print_error('Size and seed should be numbers!\n', False)
+      print_input_symbol()
+      return True
+    if random_byte_count < 0:
+      print_error('Size should not be negative!\n', False)
+      print_input_symbol()
+      return True
+    if pattern not in traffic_patterns:
+      print_error('Pattern should be one of ' + ', '.join(traffic_patterns) + '\n', False)
+      print_input_symbol()
+      return True
+    if len(arg) > 3:
+      print_warn('Ignoring extra arguments\n', False)
+    source = PatternSource(pattern, seed)
+    if len(arg) > 0 and arg[0] == 'cont':
+      if traffic_generator is not None:
+        print_warn('Traffic generator is already running, stop it with \\rand stop\n', False)
+      else:
+        traffic_generator = TrafficGenerator(tx_scheduler, source, tx_chunk_size)
+        print_info('Sending \033[0m' + pattern + '\033[2m until \\rand stop\n')
+      block_listener = True
+      print_input_symbol()
+      return True
+    print_info('\033[2mSending \033[0m' + str(random_byte_count) + '\033[2m byte(s) of \033[0m' + pattern + '\n')
+    send_start = time.monotonic()
+    wire_start = tx_scheduler.wire_time
+    sent = 0
+    if random_byte_count <= 100:
+      random_bytes = bytes(source.take(random_byte_count))
+      if serial_write(random_bytes):
+        sent = random_byte_count
+      print_raw('\n\033[F' + get_now() + ' \033[33mSend: \033[0m\033[96m' +
+                ' '.join(map(hex, random_bytes)) + '\033[0m\n')
+    else:
+      next_progress = send_start + 0.5
+      while sent < random_byte_count:
+        chunk = source.take(min(tx_chunk_size, random_byte_count - sent))
+        if not serial_write(chunk):
+          break
+        sent += len(chunk)
+        if time.monotonic() > next_progress:
+          print_send_progress(pattern, sent, random_byte_count, time.monotonic() - send_start)
+          next_progress += 0.5
+      if next_progress != send_start + 0.5:  #clear the progress line
+        print_raw('\r\033[K')
+    send_time = time.monotonic() - send_start
+    print_raw(get_now() + ' ')
+    print_info('Wrote ' + str(sent) + ' bytes')
+    if send_time > 0:
+      print_info(' in ' + format(send_time, '.2f') + ' s, \033[0m' + format(sent / send_time, '.0f') + '\033[2m B/s')
+    print_info(' (wire time ' + format(tx_scheduler.wire_time - wire_start, '.2f') + ' s)\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\ber'):
+    arg = [item for item in cin[4:].split(' ') if item != '']
+    print_time_stamp()  #print timestamp
+    if len(arg) == 0 or arg == ['stop']:
+      if ber_checker is None:
+        print_warn('BER test is not running\n', False)
+      else:
+        checker = ber_checker
+        if len(arg) != 0:
+          ber_checker = None
+          checker.stop()
+          print_info('BER test stopped\n')
+        for line in checker.describe():
+          print_info(line + '\n', len(arg) != 0)
+      block_listener = True
+      print_input_symbol()
+      return True
+    receive_only = arg[0] == 'rx'
+    if receive_only:
+      arg.pop(0)
+    if len(arg) != 1 or arg[0] not in prbs_polynomials:
+      print_error('Usage: \\ber [rx] [prbs7 | prbs15] or \\ber [stop]\n', False)
+      print_input_symbol()
+      return True
+    if ber_checker is not None:
+      print_warn('BER test is already running, stop it with \\ber stop\n', False)
+      print_input_symbol()
+      return True
+    ber_checker = BerChecker(active_port, arg[0])
+    if receive_only:
+      print_info('Checking received data against \033[0m' + arg[0] + '\n')
+    else:
+      ber_checker.generator = TrafficGenerator(tx_scheduler, PatternSource(arg[0]), tx_chunk_size)
+      print_info('Sending and checking \033[0m' + arg[0] + '\033[2m until \\ber stop\n')
+    if not listener_mute:
+      print_warn('Received data is shown, \\mute saves the time it takes\n', False)
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\profile'):
+    arg = cin[8:].strip()
+    stage_profiler = profiler
+    print_time_stamp()  #print timestamp
+    if arg == 'on':
+      if profiler is None:
+        profiler = StageProfiler()
+      print_info('Receive and send stages are timed\n')
+    elif arg == 'off':
+      profiler = None
+      print_info('Stages are not timed anymore\n')
+    elif arg == 'reset':
+      if profiler is not None:
+        profiler = StageProfiler()
+      print_info('Stage times cleared\n', False)
+    elif arg != '':
+      print_error('Usage: \\profile [on | off | reset]\n', False)
+    if arg == '' or arg == 'off':
+      if stage_profiler is None:
+        print_warn('Stages are not timed, start with \\profile on\n', False)
+      else:
+        print_info('Time spent in each stage:\n', False)
+        for line in stage_profiler.describe():
+          print_info(line + '\n', False)
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin == '\\list':
+    print_time_stamp()  #print timestamp
+    print_info('Current connection: \033[0m\033[32m' + serial_path + '\n', False)
+    print_info('Other devices:\n', False)
+    open_paths = [uart_port.path for uart_port in ports]
+    for port in port_inventory.get(search_range, skip=open_paths):
+      if port['path'] in open_paths:
+        continue
+      print_info('~ ', False)
+      if port['status'] == 'ok':
+        print_raw(port['path'])
+      elif port['status'] == 'busy' or port['status'] == 'timeout':
+        print_warn(port['path'] + ', cannot connect!', False)
+      else:
+        print_error(port['path'] + ', ' + port['status'], False)
+      print_info(describe_port(port) + '\n', False)
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\chunk'):
+    cin = cin[6:].strip()
+    print_time_stamp()  #print timestamp
+    if cin != '':
+      arg = cin.split(' ')
+      try:
+        temp = int(arg[0])
+      except ValueError:
+        print_error('Argument should be a number!\n', False)
+        print_input_symbol()
+        return True
+      if temp < 1:
+        print_error('Chunk size should be positive!\n', False)
+        print_input_symbol()
+        return True
+      if len(arg) != 1:
+        print_warn('Ignoring extra arguments\n', False)
+      tx_chunk_size = temp
+    print_info('Transmit chunk size: \033[0m' + str(tx_chunk_size) + '\033[2m bytes\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\pace'):
+    arg = cin[5:].strip().split(' ')
+    print_time_stamp()  #print timestamp
+    try:
+      if arg[0] == 'off':
+        tx_scheduler.rate = None
+        tx_scheduler.gap = 0.0
+      elif arg[0] == 'gap':
+        if len(arg) < 2:
+          raise ValueError
+        gap_chunk = 0
+        if len(arg) > 2:
+          gap_chunk = int(arg[2])
+        if len(arg) > 3:
+          print_warn('Ignoring extra arguments\n', False)
+        gap = float(arg[1]) / 1000
+        if gap <= 0 or gap_chunk < 0:
+          raise ValueError
+        tx_scheduler.rate = None
+        tx_scheduler.gap = gap
+        tx_scheduler.gap_chunk = gap_chunk
+      elif arg[0] != '':
+        rate = float(arg[0])
+        if rate <= 0:
+          raise ValueError
+        if len(arg) > 1:
+          print_warn('Ignoring extra arguments\n', False)
+        tx_scheduler.rate = rate
+        tx_scheduler.gap = 0.0
+        line_rate = 1 / tx_scheduler.byte_time
+        if rate > line_rate:
+          print_warn('Target rate is above line rate of \033[0m' + format(line_rate, '.0f') + '\033[91m B/s\n',
+                     False)
+      print_info('Transmit pacing: \033[0m' + tx_scheduler.describe() + '\n')
+    except ValueError:
+      print_error('Usage: \\pace [bytes/s | gap <ms> [bytes] | off]\n', False)
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\stats'):
+    arg = [item for item in cin[6:].split(' ') if item != '']
+    print_time_stamp()  #print timestamp
+    if len(arg) != 0:
+      if arg[0] != 'file' or len(arg) > 3:
+        print_error('Usage: \\stats [file [filename [seconds] | off]]\n', False)
+      elif len(arg) == 2 and arg[1] == 'off':
+        if metrics_writer is None:
+          print_warn('Metrics are not being written\n', False)
+        else:
+          metrics_writer.stop()
+          print_info('Stopped writing metrics to \033[0m' + metrics_writer.path + '\n')
+          metrics_writer = None
+      else:
+        try:
+          interval = float(arg[2]) if len(arg) == 3 else 1.0
+          if interval <= 0:
+            raise ValueError
+          if metrics_writer is not None:
+            metrics_writer.stop()
+            metrics_writer = None
+          metrics_path = arg[1] if len(arg) > 1 else 'uart_metrics.jsonl'
+          metrics_writer = MetricsWriter(working_directory + '/' + metrics_path, interval)
+          print_info('Metrics are written to \033[0m' + metrics_path + '\033[2m every \033[0m' + format(interval, 'g') +
+                     '\033[2m s\n')
+        except ValueError:
+          print_error('Interval should be a positive number of seconds!\n', False)
+        except OSError as metrics_error:
+          print_error('Cannot open metrics file!\n' + str(metrics_error) + '\n')
+      block_listener = True
+      print_input_symbol()
+      return True
+    print_info('Receive statistics\n', False)
+    for uart_port in ports:
+      print_rx_stats(uart_port)
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin == '\\getpath':
+    print_time_stamp()  #print timestamp
+    print_info('Current path: \033[0m' + working_directory + '\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\setpath'):
+    cin = cin.strip()
+    if cin == '\\setpath':
+      working_directory = os.getcwd()
+    else:
+      cin = cin[8:]
+      cin = cin.split(' ')
+      tmpdir = None
+      print_time_stamp()  #print timestamp
+      for arg in cin:
+        if arg != '':
+          if tmpdir is None:
+            tmpdir = arg
+          else:
+            print_warn('Ignoring extra arguments\n', False)
+            break
+      if tmpdir.startswith('~/'):
+        tmpdir = str(os.path.expanduser("~")) + tmpdir[1:]
+      elif not tmpdir.startswith('/'):
+        tmpdir = os.getcwd() + '/' + tmpdir
+      if os.path.isdir(tmpdir):
+        working_directory = tmpdir
+      else:
+        print_raw(tmpdir)
+        print_error(' is not a valid directory path!\n')
+        print_input_symbol()
+        return True
+    print_info('Working directory set to \033[0m' + working_directory + '\n')
+    if dumpfile is not None:  #keep dumping under the new directory, as dump path follows it
+      try:
+        for uart_port in ports:
+          uart_port.dump_writer.open(working_directory + '/' + get_dump_name(uart_port, dumpfile))
+      except Exception as open_error:
+        print_error('Cannot open file \033[0m' + dumpfile + '\033[31m, dumping disabled!\n')
+        print_error(str(open_error)+'\n')
+        dumpfile = None
+        for uart_port in ports:
+          uart_port.dump_writer.close()
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\pref'):
+    cin = cin[5:]
+    try:
+      cin = cin.split(' ')
+      hold_bytes = bytearray()
+      print_time_stamp()  #print timestamp
+      if len(cin) == cin.count(''):
+        prefix = None
+        print_info('Prefix removed\n')
+        block_listener = True
+      else:
+        for item in cin:
+          if item != '':
+            byte_val = int(item, 16)
+            hold_bytes += byte_val.to_bytes(1, 'little')
+        print_info('Prefix updated to ')
+        for item in cin:
+          if item != '':
+            print_info(item + ' ')
+        prefix = bytes(hold_bytes)
+        print_raw('\n')
+    except ValueError:
+      print_error('Arguments must be hexadecimal!\n', False)
+    except Exception as err:
+      print_error(str(err)+'\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\suff'):
+    cin = cin[5:]
+    try:
+      cin = cin.split(' ')
+      hold_bytes = bytearray()
+      print_time_stamp()  #print timestamp
+      if len(cin) == cin.count(''):
+        suffix = None
+        print_info('Suffix removed\n')
+      else:
+        for item in cin:
+          if item != '':
+            byte_val = int(item, 16)
+            hold_bytes += byte_val.to_bytes(1, 'little')
+        print_info('Suffix updated to ')
+        for item in cin:
+          if item != '':
+            print_info(item + ' ')
+        suffix = bytes(hold_bytes)
+        print_raw('\n')
+    except ValueError:
+      print_error('Arguments must be hexadecimal!\n', False)
+    except Exception as err:
+      print_error(str(err)+'\n')
+    block_listener = True
+    print_input_symbol()
+    return True
+  elif cin.startswith('\\'):
+    if cin.startswith('\\\\'):
+      cin = cin[1:]
+    else:
+      print_time_stamp()  #print timestamp
+      print_warn(('Command \033[0m' + cin + '\033[91m does not exist!\n'), False)
+      print_info('Use \033[0m\\help\033[2m to see the list of available commands\n', False)
+      block_listener = True
+      print_input_symbol()
+      return True
+
+  #Data handling
+  cin_org = ''  #to silence a warning
+
+  frame = bytearray()  #whole line is collected and sent at once
+  if prefix is not None:
+    frame += prefix
+  if not char:
+    cin_org = cin.replace('_', '').replace('\'', '').strip()
+    data, cin = parse_numeric(cin_org)
+    frame += data
+  else:
+    frame += cin.encode()
+  if suffix is not None:
+    frame += suffix
+  if tx_bytewise:
+    for i in range(len(frame)):
+      serial_write(frame[i:i + 1])
+  elif len(frame) != 0:
+    serial_write(frame)
+  print_time_stamp()  #print timestamp
+  if cin != '':
+    print_raw('\033[33mSend:\033[0m ')
+    if char:
+      print_raw(cin)
+    else:
+      print_raw(cin_org + ' \033[2m(' + cin + ')\033[0m')
+    print_raw('\n')
+  else:
+    print_warn('Nothing left to send!\n')
+  block_listener = True
+  print_input_symbol()
+  return True
+
+
+#Asyncio core
+def can_poll(fd):  #regular files cannot be watched by the event loop
+  selector = selectors.DefaultSelector()
+  try:
+    selector.register(fd, selectors.EVENT_READ)
+    return True
+  except (OSError, ValueError):
+    return False
+  finally:
+    selector.close()
+
+
+class InputExecutor(concurrent.futures.Executor):  #runs submitted calls in order on a single daemon thread
+  def __init__(self):
+    self.work = queue.SimpleQueue()
+    self.thread = threading.Thread(target=self.work_loop, daemon=True)  #a send still running does not hold up exit
+    self.thread.start()
+
+  def submit(self, fn, /, *args, **kwargs):
+    future = concurrent.futures.Future()
+    self.work.put((future, fn, args, kwargs))
+    return future
+
+  def work_loop(self):
+    while True:
+      future, fn, args, kwargs = self.work.get()
+      if not future.set_running_or_notify_cancel():
+        continue
+      try:
+        future.set_result(fn(*args, **kwargs))
+      except BaseException as work_error:
+        future.set_exception(work_error)
+
+
+class AsyncCore:  #serial reads, user input and timers share a single event loop instead of threads and alarms
+  def __init__(self, port_list, input_timeout=1800):
+    self.ports = port_list
+    self.input_timeout = input_timeout
+    self.input_fd = sys.stdin.fileno()
+    self.pending = bytearray()  #user input that is not terminated yet
+    self.lines = None  #complete lines waiting for the command running before them
+    self.executor = InputExecutor()  #commands may block for a long time, e.g. sending a file, so they run off the loop
+    self.loop = None
+    self.done = None
+    self.timer = None
+    self.watched = []
+
+  async def run(self):  #returns exit code
+    self.loop = asyncio.get_running_loop()
+    self.done = self.loop.create_future()
+    for uart_port in self.ports:
+      try:
+        fd = uart_port.conn.fileno()
+      except Exception:  #ports without a file descriptor keep a blocking reader
+        threading.Thread(target=self.thread_listener, args=[uart_port], daemon=True).start()
+        continue
+      self.loop.add_reader(fd, self.read_port, uart_port, fd)
+      self.watched.append(fd)
+    self.loop.add_reader(self.input_fd, self.read_input)
+    self.watched.append(self.input_fd)
+    self.timer = self.loop.call_later(self.input_timeout, self.timeout)
+    self.lines = asyncio.Queue()
+    handler = self.loop.create_task(self.handle_input())
+    try:
+      return await self.done
+    finally:
+      handler.cancel()
+      self.timer.cancel()
+      for fd in self.watched:
+        self.loop.remove_reader(fd)
+
+  def finish(self, code):
+    if not self.done.done():
+      self.done.set_result(code)
+
+  def thread_listener(self, uart_port):
+    uart_listener(uart_port)
+    self.loop.call_soon_threadsafe(self.check_alive)
+
+  def check_alive(self):  #liveness follows the readers, no periodic check is needed
+    if not listener_alive:
+      print_error('Daemon is dead!\n')
+      print_info('Exiting...\n')
+      self.finish(2)
+
+  def read_port(self, uart_port, fd):
+    try:
+      stage_profiler = profiler
+      stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+      waiting = uart_port.conn.in_waiting
+      if waiting > uart_port.waiting_max:
+        uart_port.waiting_max = waiting
+      waiting = max(1, min(waiting, rx_chunk_size))  #empty read raises if device is gone
+      received = uart_port.conn.readinto(uart_port.ring.writable(waiting))
+      if stage_profiler is not None:
+        stage_profiler.record('read', stage_start)
+      if received:
+        port_received(uart_port, received)
+    except Exception as listener_error:
+      self.loop.remove_reader(fd)
+      self.watched.remove(fd)
+      port_lost(uart_port, listener_error)
+      self.check_alive()
+
+  def timeout(self):
+    print_fatal('Timeout!\n', False)
+    log_write('fatal error: process timeout', 'error')
+    self.finish(2)
+
+  def read_input(self):
+    try:
+      data = os.read(self.input_fd, 4096)
+    except BlockingIOError:
+      return
+    if len(data) == 0:  #end of input
+      self.finish(0)
+      return
+    self.timer.cancel()
+    self.timer = self.loop.call_later(self.input_timeout, self.timeout)
+    self.pending += data
+    while True:
+      end = self.pending.find(b'\n')
+      if end == -1:
+        break
+      self.lines.put_nowait(self.pending[:end].decode(errors='replace'))
+      del self.pending[:end + 1]
+
+  async def handle_input(self):  #one line at a time on the executor, serial reads go on meanwhile
+    while not self.done.done():
+      cin = await self.lines.get()
+      try:
+        stage_profiler = profiler
+        stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+        if not await self.loop.run_in_executor(self.executor, process_input, cin):
+          self.finish(0)
+        if stage_profiler is not None:
+          stage_profiler.record('input', stage_start)
+      except serial.SerialException:
+        print_fatal('Connection to ' + serial_path + ' lost!\nExiting...\n')
+        self.finish(2)
+      except Exception as e:
+        print_fatal(str(e) + '\n')
+        print_info('Exiting...\n')
+        self.finish(0)
+
+
+def read_line(prompt):  #further input asked by a command, taken from the event loop when it owns the input
+  if input_core is None:
+    return input(prompt)
+  print_raw(prompt)
+  sys.stdout.flush()
+  return asyncio.run_coroutine_threadsafe(input_core.lines.get(), input_core.loop).result()
+
+
+#Script mode
+expect_window = 65536  #received bytes kept for expect steps while nothing matches
+
+
+class ExpectBuffer:  #received data of a port that is not matched by an expect step yet
+  def __init__(self, uart_port):
+    self.uart_port = uart_port
+    self.consumer = uart_port.ring.add_consumer('expect')
+    self.buffer = bytearray()
+
+  def expect(self, matcher, timeout):  #returns matched bytes or None on timeout, data up to the match is consumed
+    deadline = time.monotonic() + timeout
+    while True:
+      self.buffer += self.consumer.read()
+      match = matcher.search(self.buffer)
+      if match is not None:
+        matched = match.group()
+        del self.buffer[:match.end()]
+        return matched
+      if len(self.buffer) > expect_window:
+        del self.buffer[:len(self.buffer) - expect_window]
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        return None
+      if not self.uart_port.alive:
+        raise serial.SerialException('Connection to ' + self.uart_port.path + ' lost')
+      self.consumer.wait(min(remaining, 1.0))
+
+
+def run_step(args):  #expect and sleep steps, returns False when the step fails
+  if args[0] == 'sleep':
+    if len(args) != 2:
+      raise ValueError('Usage: sleep <seconds>')
+    time.sleep(float(args[1]))
+    print_time_stamp()  #print timestamp
+    print_info('Slept ' + args[1] + ' s\n', False)
+    return True
+  if len(args) != 3:
+    raise ValueError('Usage: expect <hex bytes | re:expression> <timeout in seconds>')
+  kind, pattern = parse_pattern(args[1])
+  matcher = re.compile(pattern_expression(kind, pattern), re.DOTALL)
+  timeout = float(args[2])
+  matched = active_port.expecter.expect(matcher, timeout)
+  print_time_stamp()  #print timestamp
+  if matched is None:
+    print_error('Expected \033[0m' + args[1] + '\033[31m was not received in ' + args[2] + ' s\n')
+    return False
+  print_info('Matched \033[0m' + matched.hex(' ') + '\n', False)
+  return True
+
+
+def run_script(path):  #feeds lines of a script to input handling, returns exit code
+  global block_listener
+  try:
+    with open(path) as script_file:
+      lines = script_file.read().splitlines()
+  except OSError as script_error:
+    print_fatal('Cannot read script \033[0m' + path + '\033[1;31m!\n' + str(script_error) + '\n')
+    return 3
+  steps = []  #(line number, step, seconds)
+  script_start = time.monotonic()
+  failed = None
+  for number, line in enumerate(lines, 1):
+    step = line.strip()
+    if step == '' or step.startswith('#'):
+      continue
+    print_raw(step + '\n')  #shown as if it was typed
+    args = [item for item in step.split(' ') if item != '']
+    step_start = time.monotonic()
+    try:
+      if args[0] == 'sleep' or args[0] == 'expect':
+        passed = run_step(args)
+        block_listener = True
+        print_input_symbol()
+      else:
+        passed = True
+        if not process_input(step):
+          steps.append((number, step, time.monotonic() - step_start))
+          break
+    except (ValueError, re.error) as step_error:
+      print_time_stamp()  #print timestamp
+      print_error(str(step_error) + '\n')
+      print_input_symbol()
+      passed = False
+    steps.append((number, step, time.monotonic() - step_start))
+    if not passed:
+      failed = number
+      break
+  print_raw('\n')
+  print_time_stamp()  #print timestamp
+  if failed is None:
+    print_success('Script passed, ' + str(len(steps)) + ' steps in ' + format(time.monotonic() - script_start, '.3f') +
+                  ' s\n')
+  else:
+    print_error('Script failed on line ' + str(failed) + '\n')
+  print_info('Step latencies:\n', False)
+  for number, step, seconds in steps:
+    print_info('~ line ' + str(number) + ': \033[0m' + format(seconds * 1000, '.1f') + '\033[2m ms, ' + step + '\n',
+               False)
+  if failed is None:
+    return 0
+  return 3
+
+
+#Headless capture
+capture_driver_buffer = 4096  #bytes a tty driver keeps for a reader, reads are batched well before it fills
+
+
+class HeadlessCapture:  #received data of a port read straight into a preallocated buffer and written to rotating files
+  def __init__(self, uart_port, path, rotate_size, rotate_time, buffer_size=1048576, flush_size=262144,
+               flush_interval=1.0):
+    self.uart_port = uart_port
+    self.path = path
+    self.rotate_size = rotate_size  #bytes in a file before the next one is started, 0 to never rotate by size
+    self.rotate_time = rotate_time  #seconds before the next file is started, 0 to never rotate by time
+    self.flush_size = flush_size
+    self.flush_interval = flush_interval
+    self.buffer = bytearray(buffer_size)
+    self.view = memoryview(self.buffer)
+    self.fill = 0
+    self.reader = io.FileIO(uart_port.conn.fileno(), 'rb', closefd=False)  #reads land in the buffer without a copy
+    self.fd = None
+    self.file_path = None
+    self.file_size = 0
+    self.file_start = 0
+    self.file_count = 0
+    self.byte_count = 0
+    self.read_count = 0
+    self.last_flush = time.monotonic()
+    self.checkpoint = (self.last_flush, 0, 0)
+    self.line_errors = get_line_errors(uart_port.conn)
+    self.batch_time = min(0.01, get_wire_time(uart_port, capture_driver_buffer / 2))
+
+  def get_file_path(self):  #rotated files are numbered, a number already taken is never overwritten
+    if self.rotate_size == 0 and self.rotate_time == 0:
+      return self.path
+    root, ext = os.path.splitext(self.path)
+    while True:
+      self.file_count += 1
+      file_path = root + '_' + format(self.file_count, '04d') + ext
+      if not os.path.exists(file_path):
+        return file_path
+
+  def open(self):
+    if self.fd is not None:
+      os.close(self.fd)
+      log_write('capture of ' + self.uart_port.path + ' closed ' + self.file_path + ', ' + str(self.file_size) +
+                ' bytes')
+    self.file_path = self.get_file_path()
+    self.fd = os.open(self.file_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    self.file_size = 0
+    self.file_start = time.monotonic()
+    log_write('capture of ' + self.uart_port.path + ' opened ' + self.file_path)
+
+  def close(self):
+    if self.fd is None:
+      return
+    self.flush()
+    os.close(self.fd)
+    log_write('capture of ' + self.uart_port.path + ' closed ' + self.file_path + ', ' + str(self.file_size) + ' bytes')
+    self.fd = None
+
+  def read(self):  #raises SerialException when the device is gone
+    stage_profiler = profiler
+    stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+    received = self.reader.readinto(self.view[self.fill:])
+    if stage_profiler is not None:
+      stage_profiler.record('read', stage_start)
+    if received is None:  #nothing waiting after all
+      return
+    if received == 0:
+      raise serial.SerialException('Connection to ' + self.uart_port.path + ' lost')
+    self.fill += received
+    self.byte_count += received
+    self.read_count += 1
+    if self.fill >= self.flush_size:
+      self.flush()
+
+  def flush(self):  #writes whole buffer, splitting it where a file reaches its rotation size
+    self.last_flush = time.monotonic()
+    if self.rotate_time != 0 and self.last_flush - self.file_start >= self.rotate_time:
+      self.open()
+    if self.fill == 0:
+      return
+    stage_profiler = profiler
+    stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+    position = 0
+    while position < self.fill:
+      end = self.fill
+      if self.rotate_size != 0:
+        if self.file_size >= self.rotate_size:
+          self.open()
+        end = min(end, position + self.rotate_size - self.file_size)
+      written = os.write(self.fd, self.view[position:end])
+      position += written
+      self.file_size += written
+    self.fill = 0
+    if stage_profiler is not None:
+      stage_profiler.record('dump', stage_start)
+
+  def describe(self, now):  #status of the port since last call
+    checkpoint = self.checkpoint
+    interval = now - checkpoint[0]
+    self.checkpoint = (now, self.byte_count, self.read_count)
+    status = (str(self.byte_count) + ' B, ' + format((self.byte_count - checkpoint[1]) / interval, '.0f') + ' B/s, ' +
+              format((self.read_count - checkpoint[2]) / interval, '.0f') + ' reads/s')
+    line_errors = get_line_errors(self.uart_port.conn)
+    if line_errors is not None and self.line_errors is not None:
+      lost = sum(line_errors[name] - self.line_errors[name] for name in ('overrun', 'buffer_overrun', 'frame', 'parity'))
+      status += ', ' + str(lost) + ' errors'
+    return status + ', ' + os.path.basename(self.file_path)
+
+
+def stop_capture(signum, frame):
+  raise KeyboardInterrupt
+
+
+def run_capture(path, port_list, options):  #--capture writes received data to files without prompt or renderer
+  try:
+    rotate_size = int(options['rotate-size'])
+    rotate_time = float(options['rotate-time'])
+    status_interval = float(options['status'])
+  except ValueError as arg_err:
+    print_fatal('Capture options should be numbers\n' + str(arg_err) + '\n')
+    return 1
+  captures = []
+  selector = selectors.DefaultSelector()
+  try:
+    for uart_port in port_list:
+      capture = HeadlessCapture(uart_port, get_dump_name(uart_port, path), rotate_size, rotate_time)
+      capture.open()
+      captures.append(capture)
+      selector.register(uart_port.conn.fileno(), selectors.EVENT_READ, capture)
+  except OSError as capture_error:
+    print_fatal('Cannot capture to \033[0m' + path + '\033[1;31m!\n' + str(capture_error) + '\n')
+    return 1
+  signal.signal(signal.SIGTERM, stop_capture)  #runs are often ended by a service manager
+  batch_time = min(capture.batch_time for capture in captures)
+  show_status = status_interval != 0
+  status_end = '\033[K\r' if sys.stdout.isatty() else '\n'  #a terminal keeps the status on a single line
+  capture_start = time.monotonic()
+  next_status = capture_start + status_interval
+  cpu_start = time.process_time()
+  exit_code = 0
+  print_raw(get_now())
+  print_info(' Capturing to \033[0m' + path + '\033[2m, stop with Ctrl+C\n')
+  try:
+    while len(selector.get_map()) != 0:
+      now = time.monotonic()
+      timeout = min(next_status - now, captures[0].flush_interval) if show_status else captures[0].flush_interval
+      events = selector.select(max(0, timeout))
+      for key, mask in events:
+        try:
+          key.data.read()
+        except (serial.SerialException, OSError) as listener_error:
+          selector.unregister(key.fd)
+          print_raw('\n')
+          print_fatal('Connection to ' + key.data.uart_port.path + ' lost!\n' + str(listener_error) + '\n')
+          exit_code = 2
+      now = time.monotonic()
+      for capture in captures:
+        if now - capture.last_flush >= capture.flush_interval:
+          capture.flush()
+      if show_status and now >= next_status:
+        next_status = now + status_interval
+        status = [format(now - capture_start, '.0f') + ' s']
+        for capture in captures:
+          if len(captures) > 1:
+            status.append(capture.uart_port.tag + ' ' + capture.describe(now))
+          else:
+            status.append(capture.describe(now))
+        print_raw(get_now() + ' \033[2m' + ' | '.join(status) + '\033[0m' + status_end)
+        sys.stdout.flush()
+      if len(events) != 0:
+        time.sleep(batch_time)  #let the driver gather a larger block instead of waking for every few bytes
+  except KeyboardInterrupt:
+    print_raw('\n')
+  finally:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for capture in captures:
+      try:
+        capture.close()
+      except OSError as capture_error:
+        print_error('Cannot write capture \033[0m' + str(capture.file_path) + '\033[31m!\n' + str(capture_error) + '\n')
+        exit_code = 2
+  elapsed = time.monotonic() - capture_start
+  cpu_time = time.process_time() - cpu_start
+  for capture in captures:
+    print_time_stamp()  #print timestamp
+    print_info('Captured \033[0m' + str(capture.byte_count) + '\033[2m bytes of \033[0m' + capture.uart_port.path +
+               '\033[2m in \033[0m' + str(capture.read_count) + '\033[2m reads, last file \033[0m' +
+               str(capture.file_path) + '\n')
+  print_info('Ran \033[0m' + format(elapsed, '.1f') + '\033[2m s using \033[0m' + format(cpu_time, '.2f') +
+             '\033[2m s of CPU time\n')
+  return exit_code
+
+
+#Offline tools
+replay_gap = 100000000  #ns between received chunks that starts a new line when rendering a capture
+replay_views = {
+  'char': (True, False, False, False), 'hex': (False, False, False, False),
+  'dec': (False, True, False, False), 'dechex': (False, True, False, True),
+  'bin': (False, False, True, False), 'binhex': (False, False, True, True)
+}
+pcap_header = struct.Struct('<IHHiIII')  #magic, version, time zone, accuracy, snapshot length, link type
+pcap_record = struct.Struct('<IIII')  #seconds, nanoseconds, captured size, original size
+pcap_link_type = 147  #user defined, each packet starts with direction (0 received, 1 transmitted) and port bytes
+
+
+def get_port_tag(path):
+  if path.startswith('/dev/tty'):
+    return path[8:]
+  return os.path.basename(path)
+
+
+def replay_render(reader, start, end, kinds):  #prints records in current view, returns bytes shown
+  multi = len(reader.ports) > 1
+  formatters = {}
+  for index in range(len(reader.ports)):
+    label = get_port_tag(reader.ports[index].split(' ')[0]) + ' ' if multi else ''
+    formatters[(capture_rx, index)] = RxFormatter(label)
+    formatters[(capture_tx, index)] = RxFormatter(label, 'Send:', '\033[33m')
+  last_formatter = None
+  last_time = 0
+  shown = 0
+  out = []
+  out_size = 0
+  for now, kind, port, flags, payload in reader.records(start, end, data_only=True):
+    if kind not in kinds:
+      continue
+    formatter = formatters.get((kind, port))
+    if formatter is None:
+      formatter = formatters[(kind, port)] = RxFormatter(str(port) + ' ')
+    new_line = formatter is not last_formatter or now - last_time > replay_gap or flags & capture_lost
+    if flags & capture_lost:
+      out.append(get_stamp(datetime.fromtimestamp((reader.wall_start + now) / 1e9)) + ' \033[91mbytes lost\033[0m\n')
+    text = formatter.render(payload, new_line, get_stamp(datetime.fromtimestamp((reader.wall_start + now) / 1e9)))
+    if new_line:
+      text = text[1:]  #no input symbol to write over
+    out.append(text)
+    out_size += len(text)
+    shown += len(payload)
+    last_formatter = formatter
+    last_time = now
+    if out_size > 65536:
+      print_raw(''.join(out))
+      out = []
+      out_size = 0
+  print_raw(''.join(out))
+  return shown
+
+
+def replay_send(reader, conn, start, end, kinds, speed):  #writes records to device keeping their timing
+  sent = 0
+  first = None
+  replay_start = time.perf_counter()
+  for now, kind, port, flags, payload in reader.records(start, end, data_only=True):
+    if kind not in kinds:
+      continue
+    if first is None:
+      first = now
+    if speed != 0:
+      precise_sleep(replay_start + (now - first) / 1e9 / speed)
+    conn.write(payload)
+    sent += len(payload)
+  conn.flush()
+  return sent
+
+
+def export_csv(reader, output, start, end, kinds):
+  exported = 0
+  output.write('time,seconds,direction,port,size,data\n')
+  for now, kind, port, flags, payload in reader.records(start, end, data_only=True):
+    if kind not in kinds:
+      continue
+    moment = datetime.fromtimestamp((reader.wall_start + now) / 1e9)
+    output.write(moment.isoformat() + ',' + format(now / 1e9, '.9f') + (',rx,' if kind == capture_rx else ',tx,') +
+                 str(port) + ',' + str(len(payload)) + ',' + payload.hex(' ') + '\n')
+    exported += len(payload)
+  return exported
+
+
+def export_pcap(reader, output, start, end, kinds):
+  exported = 0
+  output.write(pcap_header.pack(0xa1b23c4d, 2, 4, 0, 0, 262144, pcap_link_type))  #nanosecond resolution
+  for now, kind, port, flags, payload in reader.records(start, end, data_only=True):
+    if kind not in kinds:
+      continue
+    stamp = reader.wall_start + now
+    size = len(payload) + 2
+    output.write(pcap_record.pack(stamp // 1000000000, stamp % 1000000000, size, size))
+    output.write(bytes((0 if kind == capture_rx else 1, port)))
+    output.write(payload)
+    exported += len(payload)
+  return exported
+
+
+def run_offline(args):  #--replay and --export work on a capture and exit, returns exit code
+  global char
+  global dec_ow
+  global bin_ow
+  global hex_add
+  global block_listener
+  options = {'view': 'hex', 'from': None, 'to': None, 'direction': None, 'speed': '1'}
+  capture_path = None
+  output_path = None
+  target = None
+  export = False
+  try:
+    while len(args) != 0:
+      current = args.pop(0)
+      if current == '--replay' or current == '--export':
+        export = current == '--export'
+        capture_path = args.pop(0)
+        if export:
+          output_path = args.pop(0)
+      elif current.startswith('--') and current[2:] in options:
+        options[current[2:]] = args.pop(0)
+      elif current.startswith('tty'):
+        target = parse_port_arg(current)
+      else:
+        print_warn('Invalid argument: ' + current + '\n')
+        print_info('Skipping...\n')
+  except IndexError:
+    print_fatal('Missing value for \033[0m' + current + '\n')
+    return 1
+  except ValueError as arg_err:
+    print_fatal(str(arg_err) + '\n')
+    return 1
+  if options['view'] not in replay_views:
+    print_fatal('View should be one of ' + ', '.join(replay_views) + '\n')
+    return 1
+  char, dec_ow, bin_ow, hex_add = replay_views[options['view']]
+  block_listener = False
+  kinds = {'rx': (capture_rx,), 'tx': (capture_tx,), 'both': (capture_rx, capture_tx)}
+  direction = options['direction']
+  if direction is None:
+    direction = 'rx' if target is not None else 'both'  #a device is fed what was received from the original one
+  if direction not in kinds:
+    print_fatal('Direction should be rx, tx or both\n')
+    return 1
+  try:
+    start = None if options['from'] is None else int(float(options['from']) * 1e9)
+    end = None if options['to'] is None else int(float(options['to']) * 1e9)
+    speed = float(options['speed'])
+  except ValueError:
+    print_fatal('Time range and speed should be numbers\n')
+    return 1
+  if start is not None and end is not None and end < start:
+    print_fatal('End of time range is before its start\n')
+    return 1
+  try:
+    reader = CaptureReader(capture_path)
+  except Exception as open_err:
+    print_fatal(str(open_err) + '\n')
+    return 1
+  if not reader.closed:
+    print_warn('Capture was not closed, index is rebuilt from records\n')
+  duration = reader.duration()
+  if start is not None and start > duration:
+    print_fatal('Capture ends at \033[0m' + format(duration / 1e9, '.3f') + '\033[1;31m s, nothing to show from \033[0m' +
+                options['from'] + '\033[1;31m s\n')
+    reader.close()
+    return 1
+  work_start = time.perf_counter()
+  try:
+    if export:
+      if output_path.endswith('.csv'):
+        with open(output_path, 'w', buffering=1048576) as output:
+          size = export_csv(reader, output, start, end, kinds[direction])
+      elif output_path.endswith('.pcap'):
+        with open(output_path, 'wb', buffering=1048576) as output:
+          size = export_pcap(reader, output, start, end, kinds[direction])
+      else:
+        print_fatal('Export format should be .csv or .pcap\n')
+        return 1
+      print_info('Exported \033[0m' + str(size) + '\033[2m bytes to \033[0m' + output_path + '\n')
+    elif target is not None:
+      conn = Serial(target['path'], target.get('baud', 115200), target.get('data_size', serial.EIGHTBITS),
+                    target.get('par', serial.PARITY_NONE), target.get('stop_size', serial.STOPBITS_ONE))
+      try:
+        print_info('Replaying to \033[0m' + target['path'] + '\n')
+        size = replay_send(reader, conn, start, end, kinds[direction], speed)
+      finally:
+        conn.close()
+      print_info('Sent \033[0m' + str(size) + '\033[2m bytes\n')
+    else:
+      print_info('Capture of \033[0m' + ', '.join(reader.ports) + '\n')
+      size = replay_render(reader, start, end, kinds[direction])
+      print_info('Shown \033[0m' + str(size) + '\033[2m bytes\n')
+  except KeyboardInterrupt:
+    print_warn('Interrupted by user\n')
+    return 1
+  except Exception as replay_err:
+    print_fatal(str(replay_err) + '\n')
+    return 2
+  finally:
+    reader.close()
+  print_info('Done in ' + format(time.perf_counter() - work_start, '.2f') + ' s\n')
+  return 0
+
+
+#Benchmark
+def bench_echo(master):  #other end of the pty pair sends back everything it gets
+  try:
+    while True:
+      data = os.read(master, 65536)
+      while len(data) != 0:
+        data = data[os.write(master, data):]
+  except OSError:  #closed when benchmark ends
+    return
+
+
+def open_bench_target(target, baud_rate):  #returns connection and a function that releases it
+  if target == 'pty':
+    master, slave = os.openpty()
+    conn = Serial(os.ttyname(slave), baud_rate, timeout=0.2)
+    threading.Thread(target=bench_echo, args=[master], daemon=True).start()
+
+    def close_pty():
+      conn.close()
+      os.close(slave)
+      os.close(master)
+    return conn, close_pty
+  if target.startswith('tty'):
+    settings = parse_port_arg(target)
+    conn = Serial(settings['path'], baud_rate, settings.get('data_size', serial.EIGHTBITS),
+                  settings.get('par', serial.PARITY_NONE), settings.get('stop_size', serial.STOPBITS_ONE), timeout=0.2)
+    return conn, conn.close
+  conn = serial.serial_for_url(target, baud_rate, timeout=0.2)
+  return conn, conn.close
+
+
+def bench_receive(conn, size, result):  #runs on its own thread, reads until size bytes or half a second of silence
+  cpu_start = get_cpu_time()
+  chunk = bytearray(65536)
+  view = memoryview(chunk)
+  received = 0
+  last = time.perf_counter()
+  while received < size and time.perf_counter() - last < 0.5:
+    count = read_chunk(conn, view)
+    if count != 0:
+      received += count
+      last = time.perf_counter()
+  result['received'] = received
+  result['rx_end'] = last
+  result['rx_cpu'] = get_cpu_time() - cpu_start
+
+
+def bench_throughput(conn, size, chunk_size, time_limit):
+  block = os.urandom(65536)
+  payload = memoryview(block * (chunk_size // len(block) + 2))
+  conn.reset_input_buffer()
+  result = {}
+  receiver = threading.Thread(target=bench_receive, args=[conn, size, result])
+  receiver.start()
+  cpu_start = get_cpu_time()
+  start = time.perf_counter()
+  deadline = start + time_limit
+  sent = 0
+  while sent < size and time.perf_counter() < deadline:
+    offset = sent % len(block)
+    sent += conn.write(payload[offset:offset + min(chunk_size, size - sent)])
+  conn.flush()
+  tx_end = time.perf_counter()
+  tx_cpu = get_cpu_time() - cpu_start
+  receiver.join()
+  received = result['received']
+  return {
+    'chunk': chunk_size, 'sent': sent, 'received': received, 'lost': max(0, sent - received),
+    'tx_rate': sent / (tx_end - start), 'rx_rate': received / max(result['rx_end'] - start, 1e-9),
+    'cpu_ms_per_mb': (tx_cpu + result['rx_cpu']) / 1e6 / max(sent, 1) * 1e6  #each MB is both sent and read back
+  }
+
 
-  while True:  #main loop for listener
+def bench_latency(conn, frame_size, frame_count):  #round trip times of single frames, in microseconds
+  frame = os.urandom(frame_size)
+  chunk = bytearray(frame_size)
+  view = memoryview(chunk)
+  times = []
+  lost = 0
+  conn.reset_input_buffer()
+  for i in range(frame_count):
+    start = time.perf_counter_ns()
+    conn.write(frame)
+    received = 0
+    while received < frame_size:
+      count = conn.readinto(view[received:])
+      if count == 0:  #timed out
+        break
+      received += count
+    if received < frame_size:
+      lost += 1
+      conn.reset_input_buffer()
+      continue
+    times.append((time.perf_counter_ns() - start) / 1000)
+  times.sort()
+  result = {'frame': frame_size, 'frames': frame_count, 'lost': lost}
+  if len(times) != 0:
+    result['p50_us'] = times[len(times) // 2]
+    result['p99_us'] = times[min(len(times) - 1, len(times) * 99 // 100)]
+    result['max_us'] = times[-1]
+  return result
+
+
+def run_bench(args):  #--bench measures a loopback target and exits, returns exit code
+  options = {'baud': None, 'chunk': '64,1024,4096', 'size': '1048576', 'time': '5', 'frame': '8', 'frames': '200',
+             'json': None}
+  target = 'loop://'
+  try:
+    while len(args) != 0:
+      current = args.pop(0)
+      if current == '--bench':
+        continue
+      elif current.startswith('--') and current[2:] in options:
+        options[current[2:]] = args.pop(0)
+      elif current.startswith('tty') or current == 'pty' or '://' in current:
+        target = current
+      else:
+        print_warn('Invalid argument: ' + current + '\n')
+        print_info('Skipping...\n')
+  except IndexError:
+    print_fatal('Missing value for \033[0m' + current + '\n')
+    return 1
+  try:
+    if options['baud'] is None:
+      bauds = [parse_port_arg(target).get('baud', baud) if target.startswith('tty') else baud]
+    else:
+      bauds = [int(item) for item in options['baud'].split(',')]
+    chunks = [int(item) for item in options['chunk'].split(',')]
+    size = int(options['size'])
+    time_limit = float(options['time'])
+    frame_size = int(options['frame'])
+    frame_count = int(options['frames'])
+  except ValueError as arg_err:
+    print_fatal('Benchmark options should be numbers, lists separated by commas\n' + str(arg_err) + '\n')
+    return 1
+  report = {'target': target, 'start': datetime.now().isoformat(), 'size': size, 'runs': []}
+  for baud_rate in bauds:
     try:
-      read_byte = uart_conn.read()
-      if not listener_mute:
-        line_end = False
-        buff = ''
-        if char:
-          try:
-            buff = read_byte.decode()
-            line_end = (buff == '\n')
-            if line_end:
-              buff = ''
-          except UnicodeError:
-            buff = '\033[2m[\033[0m\033[95m' + hex(int.from_bytes(read_byte, byteorder='little'))
-            buff += '\033[0m\033[2m]\033[0m'
-            received_invalid = True
-          except Exception as decode_err:
-            print_error(str(decode_err)+'\n')
-            print_warn('Ignoring received byte\n')
-        else:
-          val = int.from_bytes(read_byte, byteorder='little')
-          if dec_ow:
-            buff = str(val)
-          elif bin_ow:
-            buff = bin(val)
-          else:
-            buff = hex(val)
-          if hex_add:
-            buff += (' (' + hex(val) + ')')
-          buff += ' '
-        byte_brake = ((not char or received_invalid) and (byte_counter == 15)) or (byte_counter == 63)
-        if (timer_stamp < get_cpu_time()) or line_end or byte_brake or block_listener:
-          received_invalid = False
-          block_listener = False
-          byte_counter = 0
-          last_line = ''
-          last_timestamp = '\033[F' + '\n' + get_now() + ' \033[36mGot:\033[0m '
-        else:
-          print_raw('\033[F\r')
-          byte_counter += 1
-        last_line += buff
-        line = last_timestamp
-        if char:
-          line += ('\033[2m\'\033[0m'+last_line+'\033[2m\'\033[0m')
-        else:
-          line += last_line
-        print_raw(line + '\n')
-        print_input_symbol()
-        sys.stdout.flush()
-        timer_stamp = get_cpu_time() + 100000
-      if dumpfile is not None:
-        try:
-          dump_path = working_directory + '/' + dumpfile
-          dump = open(dump_path, 'ab')
-          dump.write(read_byte)
-          dump.close()
-        except Exception as dump_error:
-          print_error('Cannot dump to file \033[0m' + dumpfile + '\033[31m!\n')
-          print_error(str(dump_error) + '\n')
-    except serial.SerialException:
-      print_fatal('\033[F\nConnection to ' + serial_path + ' lost!\n')
-      print_warn('Killing daemon...\n')
-      listener_alive = False
-      break
-    except Exception as listener_error:
-      print_fatal(str(listener_error) + '\n')
-      print_warn('Killing daemon...\n')
-      listener_alive = False
-      break
+      conn, release = open_bench_target(target, baud_rate)
+    except Exception as open_err:
+      print_fatal(str(open_err) + '\n')
+      return 2
+    try:
+      print_info('\nBenchmarking \033[0m' + target + '\033[2m at \033[0m' + str(baud_rate) + '\033[2m baud\n')
+      run = {'baud': baud_rate, 'throughput': [], 'latency': None}
+      for chunk_size in chunks:
+        result = bench_throughput(conn, size, chunk_size, time_limit)
+        run['throughput'].append(result)
+        print_info('~ chunk \033[0m' + str(chunk_size).rjust(6) + '\033[2m: tx \033[0m' +
+                   format(result['tx_rate'], '.0f') + '\033[2m B/s, rx \033[0m' + format(result['rx_rate'], '.0f') +
+                   '\033[2m B/s, lost \033[0m' + str(result['lost']) + '\033[2m bytes, cpu \033[0m' +
+                   format(result['cpu_ms_per_mb'], '.1f') + '\033[2m ms/MB\n', False)
+      result = bench_latency(conn, frame_size, frame_count)
+      run['latency'] = result
+      if 'p50_us' in result:
+        print_info('~ round trip of \033[0m' + str(frame_size) + '\033[2m byte frames: p50 \033[0m' +
+                   format(result['p50_us'], '.0f') + '\033[2m us, p99 \033[0m' + format(result['p99_us'], '.0f') +
+                   '\033[2m us, max \033[0m' + format(result['max_us'], '.0f') + '\033[2m us, lost \033[0m' +
+                   str(result['lost']) + '\033[2m frames\n', False)
+      else:
+        print_warn('~ no frames came back, target is not a loopback\n', False)
+      report['runs'].append(run)
+    except KeyboardInterrupt:
+      print_warn('Interrupted by user\n')
+      return 1
+    except Exception as bench_err:
+      print_fatal(str(bench_err) + '\n')
+      return 2
+    finally:
+      release()
+  if options['json'] is not None:
+    try:
+      with open(options['json'], 'w') as output:
+        json.dump(report, output, indent=2)
+      print_info('Results saved to \033[0m' + options['json'] + '\n')
+    except OSError as save_err:
+      print_error('Cannot save results to \033[0m' + options['json'] + '\033[31m!\n' + str(save_err) + '\n')
+      return 1
+  return 0
 
 
 #Main function
@@ -297,7 +4311,8 @@ if __name__ == '__main__':
   start_time = datetime.now()
   log_directory = '.uart_tool'
   program_log = None
-  log_lock = False
+  log_writer = LogWriter()
+  atexit.register(log_writer.stop)
   print_info('Welcome to the UART tool v1.4.3!\n')
   baud = 115200
   serial_path = '/dev/ttyUSB'
@@ -306,6 +4321,47 @@ if __name__ == '__main__':
   par = serial.PARITY_NONE
   par_str = 'no'
   search_range = 10
+  port_inventory = PortInventory()
+  port_args = []  #settings of every device given as argument, in argument order
+  async_core = False
+  script_path = None
+  profile_path = None
+  capture_path = None
+  capture_options = {'rotate-size': '0', 'rotate-time': '0', 'status': '1'}
+  if '--replay' in sys.argv or '--export' in sys.argv:  #offline tools do not connect to a device
+    sys.exit(run_offline(sys.argv[1:]))
+  if '--bench' in sys.argv:  #benchmark opens its own loopback target
+    sys.exit(run_bench(sys.argv[1:]))
+  if '--script' in sys.argv:  #script file is taken out before the rest of the arguments are checked
+    script_index = sys.argv.index('--script')
+    if script_index + 1 == len(sys.argv):
+      print_fatal('\nNo script file given\n')
+      sys.exit(1)
+    script_path = sys.argv[script_index + 1]
+    del sys.argv[script_index:script_index + 2]
+  if '--capture' in sys.argv:  #capture file and its options are taken out before the rest of the arguments are checked
+    try:
+      capture_index = sys.argv.index('--capture')
+      capture_path = sys.argv[capture_index + 1]
+      del sys.argv[capture_index:capture_index + 2]
+      for name in capture_options:
+        if '--' + name in sys.argv:
+          option_index = sys.argv.index('--' + name)
+          capture_options[name] = sys.argv[option_index + 1]
+          del sys.argv[option_index:option_index + 2]
+    except IndexError:
+      print_fatal('\nMissing value for capture option\n')
+      sys.exit(1)
+  if '--profile' in sys.argv:  #whole session is profiled, from argument handling on
+    profile_index = sys.argv.index('--profile')
+    if profile_index + 1 == len(sys.argv):
+      print_fatal('\nNo profile file given\n')
+      sys.exit(1)
+    profile_path = sys.argv[profile_index + 1]
+    del sys.argv[profile_index:profile_index + 2]
+    profiler = StageProfiler()
+    start_session_profile()
+    atexit.register(save_session_profile, profile_path)
   #check arguments for custom settings
   try:
     while len(sys.argv) > 1:
@@ -354,7 +4410,21 @@ if __name__ == '__main__':
         print_info('  --interactive (-i): interactive start up, tool asks for uart configurations\n')
         print_info('  --help        (-h): Print this message\n')
         print_info('  --search      (-s): Search for connected devices\n')
+        print_info('  --async       (-a): Run on a single event loop instead of listener threads\n')
+        print_info('  --script <file>   : Run lines of a file as input, with expect and sleep steps, and exit\n')
+        print_info('  --capture <file>  : Write received data to a file without prompt or terminal output until stopped\n')
+        print_info('     Capture takes --rotate-size <bytes>, --rotate-time <s> and --status <s, 0 for none>\n')
+        print_info('  --profile <file>  : Time receive and send stages and save a pstats profile of all threads\n')
+        print_info('  --bench [loop://|pty|tty<name>]: Measure throughput and round trip latency of a loopback\n')
+        print_info('     Benchmark takes --baud <list>, --chunk <list>, --size <bytes>, --time <s>, --frame <bytes>,\n')
+        print_info('     --frames <count> and --json <file>, lists are separated by commas\n')
+        print_info('  --replay <capture>: Show a capture in current view, or send it to a device given as tty<name>\n')
+        print_info('  --export <capture> <output.csv|output.pcap>: Convert a capture\n')
+        print_info('     Replay and export take --from <s>, --to <s>, --direction <rx|tx|both>, replay also takes\n')
+        print_info('     --view <hex|dec|bin|char|dechex|binhex> and --speed <times, 0 for no delay>\n')
         print_info('\n Uart configurations can be given in any order\n')
+        print_info(' Devices are given as tty<name>[:baud[:data size[:parity[:stop bits]]]], fields left out use\n')
+        print_info(' the configurations above, giving more than one device opens all of them in a single session\n')
         sys.exit(0)
       elif current.casefold() == '-i' or current.casefold().strip('--') == 'interactive':
         print_info('\nInteractive configuration mode\nLeave empty for default values\n\n')
@@ -461,55 +4531,25 @@ if __name__ == '__main__':
               print_error('Cannot connect to device \033[0m' + cin + '\033[31m!\n')
             except Exception as conn_error:
               print_error(str(conn_error) + '\n')
+      elif current.casefold().strip('--') == 'async' or current.casefold() == '-a':
+        async_core = True
       elif current.casefold().strip('--') == 'search' or current.casefold() == '-s':
         print_info('\nSearching for connected devices...\n')
         found_dev = 0
         non_res_dev = 0
-        poll_path = '/dev/ttyUSB'
-        for i in range(search_range + 1):
-          current = poll_path + str(i)
-          if os.path.exists(current):
-            try:
-              uart_conn = Serial(current, timeout=1)
-              uart_conn.close()
-              print_success('\nFound ttyUSB' + str(i))
-              found_dev += 1
-            except serial.SerialException:
-              print_warn('\nFound ttyUSB' + str(i) + ', but cannot connect!')
-              non_res_dev += 1
-            except Exception as search_err:
-              print_warn(str(search_err)+'\n')
-              print_info('Ignoring...\n')
-        poll_path = '/dev/ttyACM'
-        for i in range(search_range + 1):
-          current = poll_path + str(i)
-          if os.path.exists(current):
-            try:
-              uart_conn = Serial(current, timeout=1)
-              uart_conn.close()
-              print_success('\nFound ttyACM' + str(i))
-              found_dev += 1
-            except serial.SerialException:
-              print_warn('\nFound ttyACM' + str(i) + ', but cannot connect!')
-              non_res_dev += 1
-            except Exception as search_err:
-              print_warn(str(search_err)+'\n')
-              print_info('Ignoring...\n')
-        poll_path = '/dev/ttyCOM'
-        for i in range(search_range + 1):
-          current = poll_path + str(i)
-          if os.path.exists(current):
-            try:
-              uart_conn = Serial(current, timeout=1)
-              uart_conn.close()
-              print_success('\nFound ttyCOM' + str(i) + '\n')
-              found_dev += 1
-            except serial.SerialException:
-              print_warn('\nFound ttyCOM' + str(i) + ', but cannot connect!')
-              non_res_dev += 1
-            except Exception as search_err:
-              print_warn(str(search_err)+'\n')
-              print_info('Ignoring...\n')
+        for port in port_inventory.get(search_range):
+          name = port['path'][5:]
+          if port['status'] == 'ok':
+            print_success('\nFound ' + name)
+            print_info(describe_port(port))
+            found_dev += 1
+          elif port['status'] == 'busy' or port['status'] == 'timeout':
+            print_warn('\nFound ' + name + ', but cannot connect!')
+            print_info(describe_port(port))
+            non_res_dev += 1
+          else:
+            print_warn('\n' + name + ': ' + port['status'] + '\n')
+            print_info('Ignoring...\n')
         print_raw('\n\n')
         if found_dev != 0:
           print_success('Found ')
@@ -529,10 +4569,12 @@ if __name__ == '__main__':
           print_error('Cannot find any devices!\n')
         sys.exit(0)
       elif current.startswith('tty'):
-        serial_path = '/dev/' + current
+        settings = parse_port_arg(current)
+        serial_path = settings['path']
         try:
           uart_conn = Serial(serial_path, baud, timeout=1)
           uart_conn.close()
+          port_args.insert(0, settings)  #arguments are processed from the last one
         except serial.SerialException:
           print_fatal('\nCannot open ' + serial_path)
           print_info('\nExiting...\n')
@@ -545,51 +4587,16 @@ if __name__ == '__main__':
         print_warn('\nInvalid argument:' + current)
         print_info('\nSkipping...\n')
 
-    if serial_path == '/dev/ttyUSB':  #if no device is given, poll for it
-      for i in range(search_range + 1):
-        current = serial_path + str(i)
-        try:
-          uart_conn = Serial(current, baud, timeout=1)
-          uart_conn.close()
-          serial_path = current
-        except serial.SerialException:
-          continue
-        except Exception as dev_err:
-          print_fatal(str(dev_err) + '\n')
-          print_info('\nExiting...\n')
-          sys.exit(1)
-    if serial_path == '/dev/ttyUSB':
-      serial_path = '/dev/ttyACM'
-      for i in range(search_range + 1):
-        current = serial_path + str(i)
-        try:
-          uart_conn = Serial(current, baud, timeout=1)
-          uart_conn.close()
-          serial_path = current
-        except serial.SerialException:
-          continue
-        except Exception as dev_err:
-          print_fatal(str(dev_err) + '\n')
-          print_info('\nExiting...\n')
-          sys.exit(1)
-    if serial_path == '/dev/ttyACM':
-      serial_path = '/dev/ttyCOM'
-      current = ''
-      for i in range(search_range + 1):
-        current = serial_path + str(i)
-        try:
-          uart_conn = Serial(current, baud, timeout=1)
-          uart_conn.close()
-          serial_path = current
-        except serial.SerialException:
-          continue
-        except Exception as dev_err:
-          print_fatal(str(dev_err) + '\n')
-          print_info('\nExiting...\n')
-          sys.exit(1)
-    if serial_path == '/dev/ttyCOM':
+    if len(port_args) == 0 and serial_path == '/dev/ttyUSB':  #if no device is given, poll for it
+      for port in port_inventory.get(search_range, baud_rate=baud):
+        if port['status'] == 'ok' and port['path'].startswith(poll_paths):  #first available in poll order
+          serial_path = port['path']
+          break
+    if len(port_args) == 0 and serial_path == '/dev/ttyUSB':
       print_fatal('\nCannot find any devices, exiting...\n')
       sys.exit(1)
+    if len(port_args) == 0:
+      port_args.append({'path': serial_path})
   except KeyboardInterrupt:
     print_warn('\nInterrupted by user\n')
     print_info('\nExiting...\n')
@@ -608,18 +4615,38 @@ if __name__ == '__main__':
   safe_tx = False
   prefix = None
   suffix = None
+  tx_bytewise = False
   keep_log = False
-  listener_mute = False
+  listener_mute = script_path is not None  #scripts check received data with expect steps
   working_directory = os.getcwd()
   dumpfile = None
   log_listener_check = True
-  log_lock = False
+  rx_chunk_size = 4096  #bytes taken from the serial buffer in a single read
+  tx_chunk_size = 4096  #bytes handed to the serial device in a single write while sending files
+  checksum_names = ('crc32',)  #checksums kept for sent and received data
+  trigger_list = []  #triggers matched against received data of every port
+  traffic_generator = None  #TrafficGenerator while a pattern is sent continuously
+  ber_checker = None  #BerChecker while a bit error rate test runs
+  metrics_writer = None  #MetricsWriter while metrics are written to a file
+  input_core = None  #AsyncCore while user input is read on the event loop
+  ports = []
+  for settings in port_args:
+    ports.append(UartPort(settings['path'], settings.get('baud', baud), settings.get('data_size', data_size),
+                          settings.get('par', par), settings.get('par_str', par_str),
+                          settings.get('stop_size', stop_size), 4194304 // len(port_args)))
+    atexit.register(ports[-1].dump_writer.close)  #received bytes still buffered must reach the dumpfile on any exit
+  active_port = None
+  use_port(ports[0])
+  capture_writer = CaptureWriter()
+  atexit.register(capture_writer.close)  #a capture is only indexed once it is closed
 
   #Prepare program log
   try:
     if not os.path.isdir(log_directory):
       os.mkdir(log_directory)
     program_log = log_directory + '/uart_' + start_time.strftime('%Y-%m-%d_%Hh%Mm%Ss') + '.log'
+    if script_path is not None:  #many scripts may start in the same second
+      program_log = program_log[:-4] + '_' + str(os.getpid()) + '.log'
     log = open(program_log, 'a')
     log.write(get_log_time(start_time))
     log.write('debug: program start\n')
@@ -631,626 +4658,118 @@ if __name__ == '__main__':
     print_error(str(e)+'\n')
     print_info('Running without a log\n')
 
-  try:
-    uart_conn = Serial(serial_path, baud, data_size, par, stop_size)
-  except Exception as e:
-    print_fatal(str(e) + '\n')
-    sys.exit(2)
-
-  print_success('\nConnected to ' + serial_path)
-  print_info('\nConfigurations: ' + str(baud) + ' ' + str(data_size) + ' bits with ' + par_str + ' parity and ' + str(
-    stop_size) + ' stop bit(s)\n\n')
+  for uart_port in ports:
+    try:
+      uart_port.open()
+    except Exception as e:
+      print_fatal(str(e) + '\n')
+      for opened_port in ports:
+        if opened_port.alive:
+          opened_port.conn.close()
+      sys.exit(2)
+    print_success('\nConnected to ' + uart_port.path)
+    print_info('\nConfigurations: ' + uart_port.describe() + '\n')
+  print_raw('\n')
+  use_port(ports[0])
+  if capture_path is not None:  #headless capture reads ports itself, without listeners, renderer or prompt
+    sys.exit(run_capture(capture_path, ports, capture_options))
 
   #Set up listener daemon
+  rx_renderer = RxRenderer()
+  for uart_port in ports:
+    if len(ports) > 1:
+      uart_port.display = rx_renderer.add_source(uart_port.ring, uart_port.tag + ' ')
+    else:
+      uart_port.display = rx_renderer.add_source(uart_port.ring)
+  listener_alive = True
+  listener_closing = False
+  listener_block_count = 0
+  block_listener = False
+  if script_path is not None:
+    async_core = False
+    for uart_port in ports:
+      uart_port.expecter = ExpectBuffer(uart_port)
+  if async_core and not can_poll(sys.stdin.fileno()):
+    print_warn('Input cannot be polled, using listener threads\n')
+    async_core = False
   try:
-    listener_daemon = threading.Thread(target=uart_listener, daemon=True)
-    listener_daemon.start()
+    if async_core:
+      print_raw(get_now())
+      print_info(' Listening...\n')
+    else:
+      start_listeners(ports)
   except Exception as e:
     print_fatal(str(e) + '\n')
     sys.exit(4)
 
-  listener_alive = True
-  block_listener = False
   cin = ''
+  exit_code = 0
   print_input_symbol()
 
-  while True:  #main loop for send
+  if script_path is not None:
     try:
-      signal.signal(signal.SIGALRM, check_listener)
-      signal.alarm(1)
-      cin = input()  #Wait for input
-      stamp = '\033[F' + get_now() + ' '
-      signal.signal(signal.SIGALRM, process_timeout)
-      signal.alarm(1800)  #Half an hour
-      cin = cin.strip()
-      if cin == '':
-        print_time_stamp()  #print timestamp
-        print_info('Nothing to do!\n', False)
-        print_input_symbol()
-        continue
-
-      #command handling
-      if cin == '\\quit' or cin == '\\exit' or cin == '\\q':
-        print_time_stamp()  #print timestamp
-        break
-      elif cin == '\\help':
-        print_time_stamp()  #print timestamp
-        print_info('Help\n', False)
-        print_help()
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin == '\\license':
-        print_time_stamp()  #print timestamp
-        print_info('License\n', False)
-        print_raw('EUPL-1.2\n')
-        print_raw('Full text: https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12\n')
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin == '\\char' or cin == '\\c':
-        char = True
-        dec_ow = False
-        bin_ow = False
-        hex_add = False
-        print_time_stamp()  #print timestamp
-        print_info('Received bytes will be printed as character\n')
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin == '\\hex' or cin == '\\h':
-        print_time_stamp()  #print timestamp
-        print_info('Received bytes will be printed as hexadecimal number\n')
-        block_listener = True
-        char = False
-        dec_ow = False
-        bin_ow = False
-        hex_add = False
-        print_input_symbol()
-        continue
-      elif cin == '\\dec':
-        print_time_stamp()  #print timestamp
-        print_info('Received bytes will be printed as decimal number\n')
-        block_listener = True
-        char = False
-        dec_ow = True
-        bin_ow = False
-        hex_add = False
-        print_input_symbol()
-        continue
-      elif cin == '\\bin':
-        print_time_stamp()  #print timestamp
-        print_info('Received bytes will be printed as binary number\n')
-        block_listener = True
-        char = False
-        dec_ow = False
-        bin_ow = True
-        hex_add = False
-        print_input_symbol()
-        continue
-      elif cin == '\\dechex':
-        print_time_stamp()  #print timestamp
-        print_info('Received bytes will be printed as decimal number and hexadecimal equivalent\n')
-        block_listener = True
-        char = False
-        dec_ow = True
-        bin_ow = False
-        hex_add = True
-        print_input_symbol()
-        continue
-      elif cin == '\\binhex':
-        print_time_stamp()  #print timestamp
-        print_info('Received bytes will be printed as binary number and hexadecimal equivalent\n')
-        block_listener = True
-        char = False
-        dec_ow = False
-        bin_ow = True
-        hex_add = True
-        print_input_symbol()
-        continue
-      elif cin == '\\@':
-        print_time_stamp()  #print timestamp
-        print_info('Connected to: \033[0m' + serial_path + '\n')
-        print_input_symbol()
-        continue
-      elif cin == '\\keeplog':
-        print_time_stamp()  #print timestamp
-        if program_log is not None:
-          keep_log = True
-          print_info('Programme log will be kept\n')
-        else:
-          try:
-            log_lock = True
-            program_log = log_directory + '/uart_' + start_time.strftime('%Y%m%dh%Hm%Ms%S') + '.log'
-            log = open(program_log, 'a')
-            log.write(get_log_time(start_time))
-            log.write('program start\n')
-            log.write(get_log_time(datetime.now()))
-            log.write('log start, tool run without a log!\n')
-            log.close()
-            print_info('New log generated\n')
-            keep_log = True
-          except Exception as e:
-            print_error('Cannot keep log\n')
-            print_error(str(e)+'\n')
-          finally:
-            log_lock = False
-        print_input_symbol()
-        continue
-      elif cin == '\\safe':
-        print_time_stamp()  #print timestamp
-        print_info('Safe transmit mode enabled\n')
-        block_listener = True
-        safe_tx = True
-        print_input_symbol()
-        continue
-      elif cin == '\\unsafe':
-        print_time_stamp()  #print timestamp
-        print_info('Safe transmit mode disabled\n')
-        block_listener = True
-        safe_tx = False
-        print_input_symbol()
-        continue
-      elif cin == '\\unmute':
-        print_time_stamp()  #print timestamp
-        print_info('Listener unmuted\n')
-        listener_mute = False
-        print_input_symbol()
-        continue
-      elif cin == '\\mute':
-        print_time_stamp()  #print timestamp
-        print_info('Listener muted\n')
-        listener_mute = True
-        if dumpfile is None:
-          print_warn('Dumping is disabled, received data will be discarded!\n')
-        print_input_symbol()
-        continue
-      elif cin == '\\nodump':
-        print_time_stamp()  #print timestamp
-        print_info('Dumping disabled\n')
-        dumpfile = None
-        if listener_mute:
-          print_warn('Listener is muted, received data will be discarded!\n')
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin.startswith('\\dump'):
-        cin = cin[5:]
-        tmp_file = None
-        cin = cin.split(' ')
-        print_time_stamp()  #print timestamp
-        if len(cin) == cin.count(''):
-          tmp_file = 'uart_received.bin'
-        else:
-          for arg in cin:
-            if arg != '':
-              if tmp_file is None:
-                tmp_file = arg
-              else:
-                print_warn('Ignoring extra arguments\n', False)
-                break
-        if not os.path.isfile(working_directory + '/' + tmp_file):
-          try:
-            tmp_dump = open(working_directory + '/' + tmp_file, 'x')
-            tmp_dump.close()
-          except Exception as e:
-            print_error('Cannot find or create file \033[0m' + tmp_file + '\033[31m in current path!\n')
-            print_error(str(e) + '\n')
-            print_input_symbol()
-            continue
-        try:
-          tmp_dump = open(working_directory + '/' + tmp_file, 'r')
-          tmp_dump.close()
-          dumpfile = tmp_file
-          print_info('Received bytes will be dumped to \033[0m' + dumpfile + '\n')
-        except Exception as open_error:
-          print_error('Cannot open file \033[0m' + tmp_file + '\033[31m!\n')
-          print_error(str(open_error)+'\n')
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin.startswith('\\send') or cin.startswith('\\s ') or cin == '\\s':
-        sendByte = 0
-        sendFile = 0
-        if cin.strip() == '\\send' or cin.strip() == '\\s':
-          block_listener = True
-          files = input('Please provide the name of the file(s): ')
-        else:
-          if cin.strip() == '\\send':
-            cin = cin[5:]
-          else:
-            cin = cin[2:]
-          files = cin.strip()
-        files = files.split(' ')
-        for filename in files:
-          if filename != '':
-            file = None
-            try:
-              full_path = working_directory + '/' + filename
-              file = open(full_path, 'rb')
-              sendFile += 1
-            except Exception as open_err:
-              print_time_stamp()  #print timestamp
-              print_error('Cannot open file \033[0m' + filename + '\033[31m!\n')
-              print_error(str(open_err) + '\n')
-              if safe_tx:
-                print_info('Breaking\n')
-                break
-              else:
-                print_info('Continuing\n')
-                continue
-            byte = file.read(1)
-            while byte != b'':
-              serial_write(byte)
-              sendByte += 1
-              byte = file.read(1)
-            file.close()
-        print_time_stamp()  #print timestamp
-        if sendFile == 0:
-          print_warn("Didn't write anything\n")
-        else:
-          print_info('Wrote ' + str(sendByte) + ' bytes from ' + str(sendFile) + ' file(s)\n')
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin.startswith('\\rand') or cin.startswith('\\r ') or cin == '\\r':
-        random_byte_count = 1
-        print_time_stamp()  #print timestamp
-        if cin.strip() != '\\rand' and cin.strip() != '\\r':
-          if cin.startswith('\\rand'):
-            cin = cin[5:].strip()
-          else:
-            cin = cin[2:].strip()
-          arg = cin.split(' ')
-          try:
-            temp = int(arg[0])
-          except ValueError:
-            print_error('Argument should be a number!\n', False)
-            print_input_symbol()
-            continue
-          except Exception as rand_err:
-            print_error(str(rand_err)+'\n')
-            print_input_symbol()
-            continue
-          if len(arg) != 1:
-            print_warn('Ignoring extra arguments\n', False)
-          random_byte_count = temp
-        print_info('\033[2mSending \033[0m'+str(random_byte_count)+'\033[2m random byte(s)\n')
-        block_listener = True
-        random.seed()
-        if random_byte_count > 100:
-          print_info(('\n\033[F\033[0m' + get_now() + '\033[2m Too many bytes to show!\n'), False)
-          block_listener = True
-          for i in range(random_byte_count):
-            random_byte = random.randint(0, 255)
-            serial_write(random_byte.to_bytes(1, byteorder='little'))
-        else:
-          random_bytes = ''
-          for i in range(random_byte_count):
-            random_byte = random.randint(0, 255)
-            serial_write(random_byte.to_bytes(1, byteorder='little'))
-            random_bytes += (hex(random_byte)+' ')
-          print_raw('\n\033[F' + get_now() + ' \033[33mSend: \033[0m\033[96m'+random_bytes+'\033[0m\n')
-          block_listener = True
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin == '\\list':
-        print_time_stamp()  #print timestamp
-        print_info('Current connection: \033[0m\033[32m' + serial_path + '\n', False)
-        print_info('Other devices:\n', False)
-        poll_list = ['/dev/ttyUSB', '/dev/ttyACM', '/dev/ttyCOM']
-        for poll_path in poll_list:
-          for i in range(search_range + 1):
-            current = poll_path + str(i)
-            if current == serial_path:
-              continue
-            if os.path.exists(current):
-              print_info('~ ', False)
-              try:
-                uart_conn = Serial(current, timeout=1)
-                uart_conn.close()
-                print_raw(current + '\n')
-              except serial.SerialException:
-                print_warn(current + ', cannot connect!\n', False)
-              except Exception as search_err:
-                print_error(current + ', ' + str(search_err) + '\n', False)
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin == '\\getpath':
-        print_time_stamp()  #print timestamp
-        print_info('Current path: \033[0m' + working_directory + '\n')
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin.startswith('\\setpath'):
-        cin = cin.strip()
-        if cin == '\\setpath':
-          working_directory = os.getcwd()
-        else:
-          cin = cin[8:]
-          cin = cin.split(' ')
-          tmpdir = None
-          print_time_stamp()  #print timestamp
-          for arg in cin:
-            if arg != '':
-              if tmpdir is None:
-                tmpdir = arg
-              else:
-                print_warn('Ignoring extra arguments\n', False)
-                break
-          if tmpdir.startswith('~/'):
-            tmpdir = str(os.path.expanduser("~")) + tmpdir[1:]
-          elif not tmpdir.startswith('/'):
-            tmpdir = os.getcwd() + '/' + tmpdir
-          if os.path.isdir(tmpdir):
-            working_directory = tmpdir
-          else:
-            print_raw(tmpdir)
-            print_error(' is not a valid directory path!\n')
-            print_input_symbol()
-            continue
-        print_info('Working directory set to \033[0m' + working_directory + '\n')
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin.startswith('\\pref'):
-        cin = cin[5:]
-        try:
-          cin = cin.split(' ')
-          hold_bytes = []
-          print_time_stamp()  #print timestamp
-          if len(cin) == cin.count(''):
-            prefix = None
-            print_info('Prefix removed\n')
-            block_listener = True
-          else:
-            for item in cin:
-              if item != '':
-                byte_val = int(item, 16)
-                hold_bytes.append(byte_val.to_bytes(1, 'little'))
-            print_info('Prefix updated to ')
-            for item in cin:
-              if item != '':
-                print_info(item + ' ')
-            prefix = hold_bytes
-            print_raw('\n')
-        except ValueError:
-          print_error('Arguments must be hexadecimal!\n', False)
-        except Exception as err:
-          print_error(str(err)+'\n')
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin.startswith('\\suff'):
-        cin = cin[5:]
-        try:
-          cin = cin.split(' ')
-          hold_bytes = []
-          print_time_stamp()  #print timestamp
-          if len(cin) == cin.count(''):
-            suffix = None
-            print_info('Suffix removed\n')
-          else:
-            for item in cin:
-              if item != '':
-                byte_val = int(item, 16)
-                hold_bytes.append(byte_val.to_bytes(1, 'little'))
-            print_info('Suffix updated to ')
-            for item in cin:
-              if item != '':
-                print_info(item + ' ')
-            suffix = hold_bytes
-            print_raw('\n')
-        except ValueError:
-          print_error('Arguments must be hexadecimal!\n', False)
-        except Exception as err:
-          print_error(str(err)+'\n')
-        block_listener = True
-        print_input_symbol()
-        continue
-      elif cin.startswith('\\'):
-        if cin.startswith('\\\\'):
-          cin = cin[1:]
-        else:
-          print_time_stamp()  #print timestamp
-          print_warn(('Command \033[0m' + cin + '\033[91m does not exist!\n'), False)
-          print_info('Use \033[0m\\help\033[2m to see the list of available commands\n', False)
-          block_listener = True
-          print_input_symbol()
-          continue
-
-      #Data handling
-      send_str = ''
-      toSend = 0
-      cin_org = ''  #to silence a warning
-
-      if prefix is not None:
-        for byte in prefix:
-          serial_write(byte)
-      if not char:
-        cin = cin.replace('_', '').replace('\'', '').strip()
-        #if input is to large divide it into single transfers
-        cin_temp = ''
-        cin_org = cin
-        for item in cin.split(' '):
-          #negative = False
-          base = None
-          current_item = ''
-          if item.startswith('-'):
-            #negative = True
-            #item = item[1:]
-            print_time_stamp()  #print timestamp
-            print_warn("Cannot send negative values!\n\n")
-            print_time_stamp()  #print timestamp
-            print_info("Skipping "+item+"\n\n")
-            cin_org = cin_org.replace(item, '\b', 1)
-            continue
-          if item.startswith('0x'):
-            base = 'x'
-          elif item.startswith('0d'):
-            base = 'd'
-          elif item.startswith('0o'):
-            base = 'o'
-          elif item.startswith('0b'):
-            base = 'b'
-          if base is not None:
-            item = item[2:]
-          else:
-            if bin_ow:
-              base = 'b'
-            elif dec_ow:
-              base = 'd'
-            else:
-              base = 'x'
-          #seperate according to base
-          max_data = 0
-          if data_size == serial.EIGHTBITS:
-            max_data = 256
-          elif data_size == serial.SEVENBITS:
-            max_data = 128
-          elif data_size == serial.SIXBITS:
-            max_data = 64
-          else:
-            max_data = 32
-          try:
-            item_int = -1
-            if base == 'x':
-              item_int = int(item, 16)
-              while item_int > (max_data - 1):
-                current_item = ' ' + hex(int(item_int % max_data)) + current_item
-                item_int = int(item_int / max_data)
-              if item_int != -1:
-                current_item = ' ' + hex(int(item_int % max_data)) + current_item
-            elif base == 'd':
-              item_int = int(item, 10)
-              while item_int > (max_data-1):
-                current_item = ' 0d' + str(int(item_int % max_data)) + current_item
-                item_int = int(item_int / max_data)
-              if item_int != -1:
-                current_item = ' 0d' + str(int(item_int % max_data)) + current_item
-            elif base == 'o':
-              item_int = int(item, 8)
-              while item_int > (max_data - 1):
-                current_item = ' ' + oct(int(item_int % max_data)) + current_item
-                item_int = int(item_int / max_data)
-              if item_int != -1:
-                current_item = ' ' + oct(int(item_int % max_data)) + current_item
-            else:
-              item_int = int(item, 2)
-              while item_int > (max_data - 1):
-                current_item = ' ' + bin(int(item_int % max_data)) + current_item
-                item_int = int(item_int / max_data)
-              if item_int != -1:
-                current_item = ' ' + bin(int(item_int % max_data)) + current_item
-            cin_temp += current_item
-          except ValueError:
-            print_time_stamp()  #print timestamp
-            print_error('0' + base + item + ' is not a valid number with correct base!\n\n')
-            block_listener = True
-            if safe_tx:
-              break
-            else:
-              continue
-          except Exception as err:
-            print_error('On ' + item + ': ' + str(err)+'\n')
-            if safe_tx:
-              break
-            else:
-              continue
-        cin = cin_temp.strip()
-        toSend = 0  #use as a buffer
-        #this loop will send all buffered data
-        for item in cin.split(' '):
-          if item == '':
-            continue
-          try:
-            if item.startswith('0x'):
-              toSend = int(item[2:], 16)
-            elif item.startswith('0d'):
-              toSend = int(item[2:], 10)
-            elif item.startswith('0o'):
-              toSend = int(item[2:], 8)
-            elif item.startswith('0b'):
-              toSend = int(item[2:], 2)
-            else:
-              print_time_stamp()  #print timestamp
-              print_fatal('No base found for '+item+'! This shouldn\'t happen!')
-              break
-          except ValueError:
-            print_time_stamp()  #print timestamp
-            print_fatal(item+' is not a valid number with correct base! This shouldn\'t happen!')
-            break
-          except Exception as err:
-            print_time_stamp()  #print timestamp
-            print_error('On '+item+': '+str(err))
-            if safe_tx:
-              break
-            else:
-              continue
-          if toSend > 255 and data_size == serial.EIGHTBITS:
-            print_time_stamp()  #print timestamp
-            print_fatal(hex(toSend) + ' does not fit in a byte! This shouldn\'t happen!')
-            break
-          elif toSend > 127 and data_size == serial.SEVENBITS:
-            print_time_stamp()  #print timestamp
-            print_fatal(hex(toSend) + ' does not fit in 7 bits! This shouldn\'t happen!')
-            break
-          elif toSend > 63 and data_size == serial.SIXBITS:
-            print_time_stamp()  #print timestamp
-            print_fatal(hex(toSend) + ' does not fit in 6 bits! This shouldn\'t happen!')
-            break
-          elif toSend > 31 and data_size == serial.FIVEBITS:
-            print_time_stamp()  #print timestamp
-            print_fatal(hex(toSend) + ' does not fit in 5 bits! This shouldn\'t happen!')
-            break
-          serial_write(toSend.to_bytes(1, 'little'))
-      else:
-        serial_write(cin.encode())
-      if suffix is not None:
-        for byte in suffix:
-          serial_write(byte)
-      print_time_stamp()  #print timestamp
-      if cin != '':
-        print_raw('\033[33mSend:\033[0m ')
-        if char:
-          print_raw(cin)
-        else:
-          print_raw(cin_org + ' \033[2m(' + cin + ')\033[0m')
-        print_raw('\n')
-      else:
-        print_warn('Nothing left to send!\n')
-      block_listener = True
-      print_input_symbol()
-
-    except serial.SerialException:
-      print_fatal('Connection to ' + serial_path + ' lost!\nExiting...\n')
+      exit_code = run_script(script_path)
+    except serial.SerialException as script_error:
+      print_fatal(str(script_error) + '\nExiting...\n')
       sys.exit(2)
     except KeyboardInterrupt:
       print_warn('Interrupted by user\n')
-      break
-    except ListenerControl:
-      if listener_alive:
-        continue
-      else:
-        print_error('Daemon is dead!\n')
-        print_info('Exiting...\n')
-        sys.exit(2)
-    except TimeoutError:
+      exit_code = 3
+  elif async_core:
+    try:
+      input_core = AsyncCore(ports)
+      exit_code = asyncio.run(input_core.run())
+    except KeyboardInterrupt:
+      print_warn('Interrupted by user\n')
+      exit_code = 0
+    if exit_code != 0:
+      sys.exit(exit_code)
+  else:
+    while True:  #main loop for send
+      try:
+        signal.signal(signal.SIGALRM, check_listener)
+        signal.alarm(1)
+        cin = input()  #Wait for input
+        stamp = '\033[F' + get_now() + ' '
+        signal.signal(signal.SIGALRM, process_timeout)
+        signal.alarm(1800)  #Half an hour
+        stage_profiler = profiler
+        stage_start = 0 if stage_profiler is None else time.perf_counter_ns()
+        if not process_input(cin):
+          break
+        if stage_profiler is not None:
+          stage_profiler.record('input', stage_start)
+      except serial.SerialException:
+        print_fatal('Connection to ' + serial_path + ' lost!\nExiting...\n')
         sys.exit(2)
-    except Exception as e:
-      print_fatal(str(e) + '\n')
-      print_info('Exiting...\n')
-      break
+      except KeyboardInterrupt:
+        print_warn('Interrupted by user\n')
+        break
+      except ListenerControl:
+        if listener_alive:
+          continue
+        else:
+          print_error('Daemon is dead!\n')
+          print_info('Exiting...\n')
+          sys.exit(2)
+      except TimeoutError:
+          sys.exit(2)
+      except Exception as e:
+        print_fatal(str(e) + '\n')
+        print_info('Exiting...\n')
+        break
 
   print_info('Disconnecting...\n')
-  uart_conn.close()
+  listener_closing = True
+  for uart_port in ports:
+    if uart_port.alive:
+      uart_port.conn.close()
 
+  log_writer.stop()
   if program_log is not None and not keep_log:
     if os.path.isfile(program_log):
       os.remove(program_log)
     else:
       print_warn(('Cannot delete program log, \033[0m'+program_log+'\033[91m!\n'), False)
 
-  sys.exit(0)
+  sys.exit(exit_code)
@@ -0,0 +1,77 @@
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import tty
+import zlib
+
+import pytest
+
+uart_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Sources', 'uart.py')
+ansi_escape = re.compile(r'\033\[[0-9;]*[A-Za-z]')
+
+
+def echo(master):  #other end of the pty pair sends back everything it gets
+  try:
+    while True:
+      data = os.read(master, 65536)
+      while len(data) != 0:
+        data = data[os.write(master, data):]
+  except OSError:
+    return
+
+
+@pytest.fixture
+def echo_port():  #name of a tty that echoes, tool only takes devices under /dev
+  master, slave = os.openpty()
+  tty.setraw(slave)
+  name = 'ttyUartTest' + str(os.getpid())
+  link = '/dev/' + name
+  try:
+    os.symlink(os.ttyname(slave), link)
+  except OSError:
+    os.close(master)
+    os.close(slave)
+    pytest.skip('cannot link a pty under /dev')
+  threading.Thread(target=echo, args=[master], daemon=True).start()
+  yield name
+  os.remove(link)
+  os.close(slave)
+  os.close(master)
+
+
+def collect(stream, output):  #reads output of the tool while the test keeps writing to it
+  for line in iter(stream.readline, b''):
+    output += line
+
+
+def test_async_send_of_large_file_to_echo(echo_port, tmp_path):
+  data = os.urandom(2 * 1024 * 1024)
+  (tmp_path / 'big.bin').write_bytes(data)
+  crc = format(zlib.crc32(data), '08x')
+  received = 'Received ' + str(len(data)) + ' bytes: crc32 0x'
+  tool = subprocess.Popen([sys.executable, uart_script, echo_port, '--async'], stdin=subprocess.PIPE,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=tmp_path)
+  output = bytearray()
+  reader = threading.Thread(target=collect, args=[tool.stdout, output], daemon=True)
+  reader.start()
+  tool.stdin.write(b'\\mute\n\\crc on\n\\send big.bin\n')
+  tool.stdin.flush()
+  deadline = time.monotonic() + 60
+  while received not in ansi_escape.sub('', output.decode(errors='replace')):  #echo is back once all of it is received
+    if time.monotonic() > deadline or tool.poll() is not None:
+      tool.kill()
+      tool.wait()
+      pytest.fail('echo of the file was not received, serial reads were blocked by the send')
+    tool.stdin.write(b'\\crc\n')
+    tool.stdin.flush()
+    time.sleep(0.5)
+  tool.stdin.write(b'\\quit\n')
+  tool.stdin.flush()
+  assert tool.wait(10) == 0
+  reader.join(10)
+  output = ansi_escape.sub('', output.decode(errors='replace'))
+  assert 'Sent big.bin, ' + str(len(data)) + ' bytes, crc32 0x' + crc in output
+  assert received + crc in output
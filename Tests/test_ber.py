@@ -0,0 +1,68 @@
+import types
+
+import uart
+
+
+def make_checker(pattern='prbs7'):  #checker without its thread, data is given to check by the test
+  uart_port = types.SimpleNamespace(ring=uart.RingBuffer(4096), tag='test')
+  checker = uart.BerChecker(uart_port, pattern)
+  checker.stop()
+  return checker
+
+
+def get_stream(size, pattern='prbs7'):
+  period = uart.get_prbs_period(pattern)
+  return (period * (size // len(period) + 1))[:size]
+
+
+def test_clean_stream():
+  checker = make_checker()
+  checker.check(get_stream(1000))
+  assert (checker.checked, checker.bit_errors, checker.byte_errors, checker.slips) == (1000, 0, 0, 0)
+
+
+def test_inserted_bytes_are_counted_as_inserted():
+  stream = get_stream(600)
+  checker = make_checker()
+  checker.check(stream[:300] + b'\0\0\0' + stream[300:])  #prbs7 never has a zero byte
+  assert (checker.inserted, checker.dropped, checker.slips) == (3, 0, 1)
+  assert (checker.bit_errors, checker.byte_errors, checker.checked) == (0, 0, 600)
+  assert checker.offset == 600 % len(checker.period)
+
+
+def test_deleted_bytes_are_counted_as_dropped():
+  stream = get_stream(600)
+  checker = make_checker()
+  checker.check(stream[:300] + stream[305:])
+  assert (checker.dropped, checker.inserted, checker.slips) == (5, 0, 1)
+  assert (checker.bit_errors, checker.byte_errors, checker.checked) == (0, 0, 595)
+
+
+def test_slip_found_in_a_later_chunk():
+  stream = get_stream(2000)
+  checker = make_checker()
+  checker.check(stream[:1000] + b'\0\0')
+  checker.check(b'\0' + stream[1000:1500])
+  checker.check(stream[1540:])
+  assert (checker.inserted, checker.dropped, checker.slips) == (3, 40, 2)
+  assert (checker.bit_errors, checker.byte_errors) == (0, 0)
+
+
+def test_corrupted_bytes_at_chunk_end_are_errors():
+  stream = get_stream(600)
+  checker = make_checker()
+  corrupted = bytes(byte ^ 0xff for byte in stream[300:310])
+  checker.check(stream[:300] + corrupted)
+  checker.check(stream[310:])
+  assert (checker.slips, checker.inserted, checker.dropped) == (0, 0, 0)
+  assert (checker.byte_errors, checker.bit_errors, checker.checked) == (10, 80, 600)
+
+
+def test_errors_and_slip_in_the_same_chunk():
+  stream = bytearray(get_stream(3000))
+  stream[100] ^= 0x04
+  stream[2800] ^= 0x81
+  checker = make_checker()
+  checker.check(bytes(stream[:2500] + stream[2503:]))  #most of the chunk after the first error is in sequence
+  assert (checker.dropped, checker.inserted, checker.slips) == (3, 0, 1)
+  assert (checker.bit_errors, checker.byte_errors, checker.checked) == (3, 2, 2997)
@@ -0,0 +1,45 @@
+import pytest
+
+import uart
+
+
+class FailingConn:  #device that stops taking data after a number of writes
+  def __init__(self, writes):
+    self.writes = writes
+    self.data = bytearray()
+
+  def write(self, data):
+    if self.writes == 0:
+      raise OSError('device went away')
+    self.writes -= 1
+    self.data += data
+
+
+@pytest.fixture
+def data_file(tmp_path, monkeypatch):  #globals main sets up before files are sent
+  monkeypatch.setattr(uart, 'program_log', None, raising=False)
+  monkeypatch.setattr(uart, 'checksum_names', ('crc32',), raising=False)
+  monkeypatch.setattr(uart, 'tx_chunk_size', 4096, raising=False)
+  path = tmp_path / 'data.bin'
+  path.write_bytes(bytes(range(256)) * 40)
+  return path
+
+
+def send(path, monkeypatch, writes):
+  scheduler = uart.TxScheduler(0.0)
+  scheduler.conn = FailingConn(writes)
+  monkeypatch.setattr(uart, 'tx_scheduler', scheduler, raising=False)
+  checksums = uart.ChecksumSet(('crc32',))
+  with open(path, 'rb') as file:
+    sent_all = uart.send_file(file, path.name, checksums)
+  return sent_all, checksums.size, bytes(scheduler.conn.data)
+
+
+def test_failed_write_stops_send_and_counts_written_bytes(data_file, monkeypatch):
+  sent_all, size, written = send(data_file, monkeypatch, 2)
+  assert not sent_all
+  assert size == len(written) == 8192
+
+
+def test_whole_file_is_sent(data_file, monkeypatch):
+  assert send(data_file, monkeypatch, 3) == (True, 10240, data_file.read_bytes())
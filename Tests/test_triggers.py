@@ -0,0 +1,60 @@
+import types
+
+import uart
+
+
+def make_stage(patterns):  #stage without its thread, chunks are fed by the test and fired matches are collected
+  uart_port = types.SimpleNamespace(ring=uart.RingBuffer(4096), tag='test')
+  stage = uart.TriggerStage(uart_port, [uart.make_trigger([pattern, 'bell']) for pattern in patterns])
+  stage.stop()
+  fired = []
+  stage.fire = lambda index, match_start, match_end, matched: fired.append((index, match_start, match_end, matched))
+  return uart_port.ring, stage, fired
+
+
+def feed(ring, stage, *chunks):
+  for chunk in chunks:
+    ring.write(chunk)
+    stage.process()
+
+
+def test_expression_extended_by_next_chunk_fires_once():
+  ring, stage, fired = make_stage(['re:A[0-9]+'])
+  feed(ring, stage, b'xA12', b'3y')
+  assert fired == [(0, 1, 4, b'A12')]
+
+
+def test_expression_split_across_chunks():
+  ring, stage, fired = make_stage(['re:BOOT v[0-9]'])
+  feed(ring, stage, b'..BO', b'OT v', b'7..')
+  assert fired == [(0, 2, 9, b'BOOT v7')]
+
+
+def test_bytes_split_across_chunks():
+  ring, stage, fired = make_stage(['aa55', '55'])
+  feed(ring, stage, b'\x00\xaa', b'\x55\x00')
+  assert fired == [(0, 1, 3, b'\xaa\x55'), (1, 2, 3, b'\x55')]
+
+
+def test_occurrences_in_consecutive_chunks_fire_separately():
+  ring, stage, fired = make_stage(['re:A[0-9]+'])
+  feed(ring, stage, b'A1', b'xA2')
+  assert fired == [(0, 0, 2, b'A1'), (0, 3, 5, b'A2')]
+
+
+def test_quantified_expression_fires_once_per_occurrence():
+  ring, stage, fired = make_stage(['re:[0-9]+', 're:A+'])
+  feed(ring, stage, b'12345 AAAA')
+  assert fired == [(0, 0, 5, b'12345'), (1, 6, 10, b'AAAA')]
+
+
+def test_quantified_expression_extended_by_next_chunk_fires_once():
+  ring, stage, fired = make_stage(['re:[0-9]+'])
+  feed(ring, stage, b'x12', b'34y')
+  assert fired == [(0, 1, 3, b'12')]
+
+
+def test_repeated_bytes_fire_once_per_occurrence():
+  ring, stage, fired = make_stage(['aaaa'])
+  feed(ring, stage, b'\xaa' * 6)
+  assert fired == [(0, 0, 2, b'\xaa\xaa'), (0, 2, 4, b'\xaa\xaa'), (0, 4, 6, b'\xaa\xaa')]